@@ -1,6 +1,6 @@
 from fastapi import APIRouter, Depends, HTTPException
 from fastapi.responses import StreamingResponse
-from app.utils.audio_utils import music_source_separation
+from app.utils.audio_utils import music_source_separation, raw_music_source_separation
 from app.utils.streaming_utils import convert_to_audio_buffer, buffer_generator
 from app.utils.logging_utils import get_logger
 from app.services.storage import storage
@@ -17,6 +17,13 @@ async def upload_audio(result: dict[str, AudioEntry] = Depends(music_source_sepa
     return result
 
 
+# === Upload Raw Audio Endpoint ===
+@audio_router.post("/upload_audio_raw/{model}", response_model=dict[str, AudioEntry])
+async def upload_audio_raw(result: dict[str, AudioEntry] = Depends(raw_music_source_separation)) -> dict[str, AudioEntry]:
+    """Endpoint to upload interleaved float32 PCM samples as the request body (X-Sample-Rate, X-Channels and optional X-Filename headers) for music source separation without audio decoding"""
+    return result
+
+
 # === Download Audio Endpoint ===
 @audio_router.get("/download_audio/{file_id}")
 async def download_audio(file_id: str) -> StreamingResponse:
@@ -9,4 +9,7 @@ class WorkerData(Worker):
     status: str = "ready"  # e.g. "ready", "busy";
 
 class WorkerConfig(Worker): 
-    main_address: str
\ No newline at end of file
+    main_address: str
+    precision: str | None = None # Optional mixed precision for inference on CUDA: "bf16" or "fp16"
+    compile: bool = False # Optional torch.compile of the model at startup
+    parallel_sources: bool = False # DTTNet only: optionally run the four source models concurrently on separate CUDA streams
\ No newline at end of file
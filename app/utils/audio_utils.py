@@ -1,4 +1,4 @@
-from fastapi import File, UploadFile, HTTPException, Depends, Response
+from fastapi import File, UploadFile, HTTPException, Depends, Response, Request, Header
 from app.services.storage import storage
 from app.services.session_manager import session_manager
 from app.schemas.audio_schemas import AudioEntry
@@ -6,18 +6,30 @@ from app.schemas.worker_schemas import WorkerConfig
 from app.utils.logging_utils import get_logger
 from pathlib import Path
 import soundfile as sf
-import io, torchaudio, httpx, zipfile, uuid
+import numpy as np
+import io, asyncio, torchaudio, httpx, zipfile, uuid
 
 logger = get_logger(__name__) # Logger for audio_utils module
 
 
+# === Decode Uploaded Audio File Function ===
+def _decode_upload(file: io.IOBase) -> tuple[np.ndarray, int]:
+    """Function to decode an uploaded audio file object to a float32 (channels, samples) waveform, trying libsndfile first and falling back to torchaudio's ffmpeg backend for formats it cannot read (e.g. AAC/M4A, WMA)"""
+    file.seek(0) # Rewind in case the upload was already read upstream
+    try:
+        samples, sample_rate = sf.read(file, dtype="float32", always_2d=True) # Decodes straight from the spooled upload without reading it into memory first
+        return samples.T, sample_rate # (channels, samples) view, the layout torchaudio.load returns
+    except sf.LibsndfileError:
+        file.seek(0)
+        waveform, sample_rate = torchaudio.load(file)
+        return waveform.numpy(), sample_rate
+
+
 # === Verify Uploaded Audio File and Load Waveform Function ===
 async def _audio_file_verification(file: UploadFile = File(...)) -> dict:
     """Function to verify if the uploaded file is a valid audio file and load its waveform"""
     try:
-        audio_bytes = await file.read() # Read uploaded audio file bytes
-        audio_buffer = io.BytesIO(audio_bytes) # Create in-memory buffer for audio data
-        waveform, sample_rate = torchaudio.load(audio_buffer) # Checking if the data is a valid audio file
+        waveform, sample_rate = await asyncio.to_thread(_decode_upload, file.file) # Decode off the event loop; also checks the data is a valid audio file
         logger.info(action="audio_loading", status="success", data={"filename": file.filename, "sample_rate": sample_rate, "shape": tuple(waveform.shape)})
     
     except Exception as e:
@@ -26,15 +38,35 @@ async def _audio_file_verification(file: UploadFile = File(...)) -> dict:
     
     return {
         "file": file, 
+        "filename": file.filename,
         "waveform": waveform, 
         "sample_rate": sample_rate
     }
 
 
+# === Verify Raw PCM Upload and Load Waveform Function ===
+async def _raw_audio_verification(request: Request, x_sample_rate: int = Header(...), x_channels: int = Header(...), x_filename: str = Header("audio.wav")) -> dict:
+    """Function to verify a raw interleaved little-endian float32 PCM upload and view it as a waveform without decoding"""
+    audio_bytes = await request.body() # Read raw request body; no multipart parsing and no audio container
+    frame_size = 4 * x_channels # Bytes per frame (4 bytes per float32 sample)
+    if x_sample_rate <= 0 or x_channels <= 0 or not audio_bytes or len(audio_bytes) % frame_size:
+        logger.warning(action="audio_loading", status="failed", data={"filename": x_filename, "status_code": 400, "error": "invalid_raw_audio", "size": len(audio_bytes)})
+        raise HTTPException(status_code=400, detail="Invalid audio file")
+
+    waveform = np.frombuffer(audio_bytes, dtype="<f4").reshape(-1, x_channels).T # Zero-copy (channels, samples) view, the layout torchaudio.load returns
+    logger.info(action="audio_loading", status="success", data={"filename": x_filename, "sample_rate": x_sample_rate, "shape": tuple(waveform.shape)})
+
+    return {
+        "filename": x_filename,
+        "waveform": waveform,
+        "sample_rate": x_sample_rate
+    }
+
+
 # === Get Inference Result from SCNet Worker Function ===
-async def _get_result(worker: WorkerConfig, waveform: object, sample_rate: int, filename: str) -> tuple[io.BytesIO, dict, str, str]:
+async def _get_result(worker: WorkerConfig, waveform: object, sample_rate: int, filename: str) -> tuple[io.BytesIO, str | None]:
     audio_buffer = io.BytesIO() # Create in-memory buffer for audio data
-    sf.write(audio_buffer, waveform.T, sample_rate, format="WAV") # Write waveform to buffer in WAV format
+    sf.write(audio_buffer, waveform.T, sample_rate, format="WAV", subtype="PCM_16") # Write waveform to buffer in WAV format; PCM_16 is already sf.write's WAV default, pinned here so the wire format to the worker cannot change silently
     audio_buffer.seek(0) # Reset buffer pointer to the beginning
 
     async with httpx.AsyncClient(timeout=None) as client:  # HTTP client with no timeout
@@ -46,11 +78,9 @@ async def _get_result(worker: WorkerConfig, waveform: object, sample_rate: int,
         logger.error(action="inference_request", status="failed", data={"worker_id": worker.worker_id, "status_code": response.status_code, "error": response.text})
         raise HTTPException(status_code=response.status_code, detail=response.text)
 
-    headers = response.headers # Extract separation timestamps (if provided) from worker response headers
-    t0_model = headers.get("separation-start") # Get separation timestamps from worker response headers
-    t1_model = headers.get("separation-end")
+    separation_duration = response.headers.get("separation-duration-ns") # Get separation duration (if provided) from worker response headers
 
-    return io.BytesIO(response.content), t0_model, t1_model # Return in-memory ZIP buffer for received ZIP file and separation timestamps
+    return io.BytesIO(response.content), separation_duration # Return in-memory ZIP buffer for received ZIP file and separation duration
 
 
 # === Process Inference Result from SCNet Worker Function ===
@@ -89,7 +119,7 @@ async def music_source_separation(model: str, audiofile: dict = Depends(_audio_f
         logger.warning(action="model_validation", status="failed", data={"status_code": 400, "error": "invalid_model_type"})
         raise HTTPException(status_code=400, detail="Model type must be a non-empty string")
 
-    file = audiofile["file"]
+    filename = audiofile["filename"]
     waveform = audiofile["waveform"]
     sample_rate = audiofile["sample_rate"]
     model = model.strip().lower()
@@ -104,20 +134,25 @@ async def music_source_separation(model: str, audiofile: dict = Depends(_audio_f
         raise HTTPException(status_code=503, detail=f"No available {model} workers")
    
     try:
-        result_zip, t0_model, t1_model = await _get_result(worker, waveform, sample_rate, file.filename)
-        result = await _process_result(result_zip, file.filename)  # Process the received ZIP file
+        result_zip, separation_duration = await _get_result(worker, waveform, sample_rate, filename)
+        result = await _process_result(result_zip, filename)  # Process the received ZIP file
         if not result or not result_zip:
-            logger.warning(action="separation_completion", status="failed", data={"filename": file.filename, "error": "no_stems_extracted"})
+            logger.warning(action="separation_completion", status="failed", data={"filename": filename, "error": "no_stems_extracted"})
             raise HTTPException(status_code=500, detail="No stems extracted from the audio file")
 
-        if response is not None and (t0_model is not None and t1_model is not None):
-            response.headers["separation-start"] = t0_model # Propagate separation timestamps to response headers (for HTTP client to measure separation-only time)
-            response.headers["separation-end"] = t1_model
-            logger.info(action="inference_timestamp_propagation", status="success", data={"filename": file.filename, "separation-start": t0_model, "separation-end": t1_model})
+        if response is not None and separation_duration is not None:
+            response.headers["separation-duration-ns"] = separation_duration # Propagate separation duration to response headers (for HTTP client to measure separation-only time)
+            logger.info(action="inference_duration_propagation", status="success", data={"filename": filename, "separation-duration-ns": separation_duration})
 
-        logger.info(action="separation_completion", status="success", data={"filename": file.filename, "num_stems": len(result)})
+        logger.info(action="separation_completion", status="success", data={"filename": filename, "num_stems": len(result)})
 
         return result
         
     finally:
-        await session_manager.release_worker(worker.worker_id) # Release the worker back to the session manager
\ No newline at end of file
+        await session_manager.release_worker(worker.worker_id) # Release the worker back to the session manager
+
+
+# === Perform Music Source Separation on Raw PCM Upload Function ===
+async def raw_music_source_separation(model: str, audiofile: dict = Depends(_raw_audio_verification), response: Response = None) -> dict[str, AudioEntry]:
+    """Function to perform music source separation on a raw float32 PCM upload"""
+    return await music_source_separation(model, audiofile, response)
@@ -0,0 +1,29 @@
+from functools import lru_cache
+import numpy as np
+import struct
+
+
+# === Build WAV Header Function ===
+@lru_cache(maxsize=64) # Stems and clips of the same length share one header, so it is packed once per length
+def wav_header(num_frames: int, num_channels: int, sample_rate: int) -> bytes:
+    """Function to build the 44-byte RIFF/WAVE header for 16-bit PCM samples, as libsndfile writes it"""
+    block_align = num_channels * 2 # Bytes per frame (2 bytes per 16-bit sample)
+    data_size = num_frames * block_align
+    return struct.pack(
+        "<4sI4s4sIHHIIHH4sI",
+        b"RIFF", 36 + data_size, b"WAVE", # RIFF chunk size counts everything after this field
+        b"fmt ", 16, 1, num_channels, sample_rate, sample_rate * block_align, block_align, 16, # fmt chunk: PCM format tag 1, 16 bits per sample
+        b"data", data_size,
+    )
+
+
+# === Convert Float Samples to 16-bit PCM Function ===
+def to_pcm16(samples: np.ndarray, block_frames: int = 64 * 1024) -> np.ndarray:
+    """Function to convert float samples to a little-endian int16 array of the same shape, with libsndfile's scaling, rounding and clipping so output matches sf.write(..., subtype="PCM_16")"""
+    pcm = np.empty(samples.shape, dtype="<i2")
+    for start in range(0, len(samples), block_frames): # Block by block, so the float64/int64 temporaries stay small for whole tracks
+        scaled = samples[start:start + block_frames].astype(np.float64) * 2.0**31 # libsndfile scales to 32-bit first and keeps the top 16 bits
+        np.nan_to_num(scaled, copy=False, nan=-2.0**31)
+        np.clip(scaled, -2.0**31, 2.0**31 - 1, out=scaled) # Out-of-range samples saturate
+        pcm[start:start + block_frames] = np.rint(scaled).astype(np.int64) >> 16
+    return pcm
@@ -5,7 +5,7 @@ import pytest, pytest_asyncio, io, httpx, yaml
 
 # === Main Address Loaded from YAML File ===
 with open("workers/scnet/scnet1_config.yaml", "r") as f:
-    config = yaml.safe_load(f)
+    config = yaml.load(f, Loader=getattr(yaml, "CSafeLoader", yaml.SafeLoader)) # libyaml C loader when available
 main_address = config["main_address"]  # e.g., "127.0.0.1:8000"; If tests are run on the host (not inside Docker) the compose service name `main:8000` is not resolvable from the host
 
 if isinstance(main_address, str) and main_address.startswith("main:"): # When the config contains the compose service name, 
@@ -26,6 +26,40 @@ def test_upload_audio(client, model, sample_audio_file):
             assert field in stem_info, f"[{model}] Field '{field}' missing in stem '{stem}' info" # Check if each expected field is present in the stem info
 
 
+# === Test upload_audio_raw Endpoint ===
+@pytest.mark.parametrize("model", ["scnet", "dttnet"])
+def test_upload_audio_raw(client, model):
+    """Testing upload_audio_raw endpoint for successful stem extraction from raw float32 PCM
+    1. Check the response status code is 200
+    2. Check the response JSON contains expected stems and fields"""
+
+    sample_rate = 44100
+    waveform = np.random.randn(sample_rate, 2).astype(np.float32) * 0.1 # 1 second of random stereo noise as (samples, channels)
+    headers = {"X-Sample-Rate": str(sample_rate), "X-Channels": "2", "X-Filename": "test.wav"}
+    upload_response = client.post(f"/upload_audio_raw/{model}", content=waveform.tobytes(), headers=headers, timeout=60.0) # Interleaved little-endian float32 samples as the request body; Extended timeout for DTTNet
+    assert upload_response.status_code == 200, f"[{model}] Unexpected status code: {upload_response.status_code}"
+    data = upload_response.json()
+    expected_stems = {"vocals", "drums", "bass", "other"}
+    for stem in expected_stems:
+        assert stem in data, f"[{model}] Stem '{stem}' not found in response"
+        stem_info = data[stem]
+        for field in ["file_id", "filename", "download_url"]:
+            assert field in stem_info, f"[{model}] Field '{field}' missing in stem '{stem}' info"
+
+
+# === Test upload_audio_raw Endpoint with Invalid Body ===
+def test_upload_audio_raw_invalid_body(client):
+    """Testing upload_audio_raw endpoint with a body that is not a whole number of frames
+     1. Check the response status code is 400
+     2. Check the response JSON contains the expected error message"""
+
+    headers = {"X-Sample-Rate": "44100", "X-Channels": "2"}
+    response = client.post("/upload_audio_raw/scnet", content=b"\x00" * 10, headers=headers) # 10 bytes cannot hold whole 8-byte stereo float32 frames
+    assert response.status_code == 400, f"Unexpected status code: {response.status_code}"
+    data = response.json()
+    assert data["detail"] == "Invalid audio file", f"Unexpected error message: {data['detail']}"
+
+
 # === Test download_audio Endpoint ===
 @pytest.mark.parametrize("model", ["scnet", "dttnet"])
 @pytest.mark.parametrize("sample_audio_file", ["WAV", "FLAC"], indirect=True) # Run test for both "WAV" and "FLAC" formats; indirect=True tells pytest to pass the param to the fixture not the test function
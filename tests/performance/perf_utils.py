@@ -0,0 +1,119 @@
+from functools import lru_cache
+from pathlib import Path
+import numpy as np
+import yaml, csv, io, os, struct, sys
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2])) # Repo root, so the WAV helpers shared with the workers import when the scripts are run directly
+from app.utils.wav_utils import wav_header, to_pcm16
+
+_YAML_LOADER = getattr(yaml, "CSafeLoader", yaml.SafeLoader) # libyaml C loader when PyYAML was built with it, pure-Python safe loader otherwise
+
+
+# === Main Address Loaded from YAML File Function ===
+@lru_cache(maxsize=1)
+def get_main_address(config_path: str = "workers/scnet/scnet1_config.yaml") -> str:
+    """Function to read main_address from the worker config once and map the compose service name to localhost"""
+    with open(config_path, "r") as f:
+        config = yaml.load(f, Loader=_YAML_LOADER)
+    main_address = config["main_address"]  # e.g., "127.0.0.1:8000"; If tests are run on the host (not inside Docker) the compose service name `main:8000` is not resolvable from the host
+
+    if isinstance(main_address, str) and main_address.startswith("main:"): # When the config contains the compose service name,
+        _, port = main_address.split(":", 1) # translate it to the host address so tests can connect to the published port (localhost)
+        main_address = f"127.0.0.1:{port}"
+
+    return main_address
+
+
+# === Create CSV File with Header Function ===
+def ensure_csv(csv_path: str, header: list[str]) -> str:
+    """Function to create a results CSV with its header row on first use; Existing files are left untouched so results accumulate"""
+    if not os.path.exists(csv_path):
+        with open(csv_path, "w", newline="") as cf:
+            csv.writer(cf).writerow(header)
+    return csv_path
+
+
+# === Streamed WAV Upload Body Class ===
+class WavStream(io.RawIOBase):
+    """Seekable read-only file object yielding a WAV header followed by int16 samples, so uploads stream from the sample array without assembling the whole file"""
+
+    def __init__(self, header: bytes, pcm: np.ndarray):
+        self._parts = [memoryview(header), memoryview(np.ascontiguousarray(pcm)).cast("B")] # Byte views; no copy of the samples
+        self._size = sum(part.nbytes for part in self._parts)
+        self._pos = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True # httpx seeks to the end to find the Content-Length and back to 0 before (re)sending
+
+    def tell(self) -> int:
+        return self._pos
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self._pos, io.SEEK_END: self._size}[whence]
+        self._pos = max(0, base + offset)
+        return self._pos
+
+    def readinto(self, b) -> int:
+        out = memoryview(b).cast("B")
+        written, pos = 0, self._pos
+        for part in self._parts:
+            if written == len(out):
+                break
+            if pos >= part.nbytes: # Position lies past this part
+                pos -= part.nbytes
+                continue
+            n = min(part.nbytes - pos, len(out) - written)
+            out[written:written + n] = part[pos:pos + n]
+            written += n
+            pos = 0 # Following parts are read from their start
+        self._pos += written
+        return written
+
+
+# === Encode Waveform to WAV Stream Function ===
+def wav_stream(waveform: np.ndarray, sample_rate: int) -> WavStream:
+    """Function to encode a (samples, channels) float waveform as a streamed 16-bit PCM WAV upload body, byte-identical to libsndfile's output"""
+    if waveform.ndim == 1: # Mono
+        waveform = waveform[:, np.newaxis]
+    return pcm16_wav_stream(to_pcm16(waveform), sample_rate)
+
+
+# === Wrap 16-bit PCM in WAV Stream Function ===
+def pcm16_wav_stream(pcm: np.ndarray, sample_rate: int) -> WavStream:
+    """Function to wrap already converted (samples, channels) int16 samples, e.g. a row slice of a longer recording, as a streamed WAV upload body"""
+    num_frames, num_channels = pcm.shape
+    return WavStream(wav_header(num_frames, num_channels, sample_rate), pcm) # Row slices of a C-contiguous array are contiguous, so no copy is made
+
+
+# === Decode WAV Bytes Function ===
+_WAV_DTYPES = {(1, 8): "u1", (1, 16): "<i2", (1, 32): "<i4", (3, 32): "<f4", (3, 64): "<f8"} # (format tag, bits per sample) -> sample dtype
+
+def decode_wav_bytes(buf: bytes) -> tuple[np.ndarray, int]:
+    """Function to return a read-only (samples, channels) view over the PCM data chunk of a WAV file and its sample rate, without copying"""
+    riff, _, wave = struct.unpack_from("<4sI4s", buf, 0)
+    if riff != b"RIFF" or wave != b"WAVE":
+        raise ValueError("not a RIFF/WAVE file")
+
+    offset, fmt = 12, None
+    while offset + 8 <= len(buf): # Walk the chunks; writers may put LIST/fact chunks before data
+        chunk_id, chunk_size = struct.unpack_from("<4sI", buf, offset)
+        offset += 8
+        if chunk_id == b"fmt ":
+            fmt = struct.unpack_from("<HHIIHH", buf, offset) # format tag, channels, sample rate, byte rate, block align, bits per sample
+            if fmt[0] == 0xFFFE: # WAVE_FORMAT_EXTENSIBLE; the sub-format GUID starts with the real format tag
+                fmt = (struct.unpack_from("<H", buf, offset + 24)[0], *fmt[1:])
+        elif chunk_id == b"data":
+            if fmt is None:
+                raise ValueError("WAV data chunk before fmt chunk")
+            format_tag, num_channels, sample_rate, _, block_align, bits = fmt
+            dtype = _WAV_DTYPES.get((format_tag, bits))
+            if dtype is None:
+                raise ValueError(f"unsupported WAV encoding: format {format_tag}, {bits} bits")
+            num_frames = min(chunk_size, len(buf) - offset) // block_align # Streaming writers may leave the size unset, so clamp to the buffer
+            waveform = np.frombuffer(buf, dtype=dtype, count=num_frames * num_channels, offset=offset) # View keeps a reference to buf, so it stays alive as long as the array does
+            return waveform.reshape(num_frames, num_channels), sample_rate
+        offset += chunk_size + (chunk_size & 1) # Chunks are word aligned
+    raise ValueError("WAV file has no data chunk")
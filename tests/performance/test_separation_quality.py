@@ -1,148 +1,347 @@
-import soundfile as sf
+import os
+os.environ.setdefault("OMP_NUM_THREADS", "1") # Set before numpy loads BLAS; evaluation runs in one process per core, so multithreaded BLAS in each would oversubscribe the CPU
+
 import numpy as np
+import pandas as pd
 from pathlib import Path
-import musdb, museval, io, csv, os, yaml, httpx, argparse
+from functools import lru_cache
+from decimal import Decimal
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from perf_utils import get_main_address, ensure_csv, WavStream, wav_stream, decode_wav_bytes
+import musdb, museval, csv, httpx, argparse, asyncio, multiprocessing, orjson
 
 # --- Separation Quality Benchmark Test ---
 
-# === Load MUSDB18-HQ Dataset ===
-mus = musdb.DB(root="", is_wav=True, subsets="test")
-
-
-# === Main Address Loaded from YAML File ===
-with open("workers/scnet/scnet1_config.yaml", "r") as f:
-    config = yaml.safe_load(f)
-main_address = config["main_address"]  # e.g., "127.0.0.1:8000"; If tests are run on the host (not inside Docker) the compose service name `main:8000` is not resolvable from the host
-
-if isinstance(main_address, str) and ":" in main_address: # When the config contains the compose service name, 
-    _, port = main_address.split(":", 1) # translate it to the host address so tests can connect to the published port (localhost)
-    main_address = f"127.0.0.1:{port}"
-
-
-# === Create HTTP Client ===
-client = httpx.Client(base_url=f"http://{main_address}", timeout=None)
+# === Load MUSDB18-HQ Dataset Function ===
+@lru_cache(maxsize=1)
+def get_mus() -> musdb.DB:
+    """Function to scan the MUSDB18-HQ test set on first use rather than at import, so importing this module (pytest collection, spawned evaluation workers) stays cheap"""
+    return musdb.DB(root="", is_wav=True, subsets="test")
 
 
 # === Prepare Results Directory and CSV Files for Separation Quality Test Results ===
 results_dir = "tests/performance/separation_quality"
-os.makedirs(results_dir, exist_ok=True)  # Create results directory if it doesn't exist; exist_ok=True avoids error if it already exists
+cache_dir = os.environ.get("MUSDB_NPY_CACHE", os.path.join(os.path.expanduser("~"), ".cache", "musdb18hq_npy")) # About 20 GB of .npy mixtures and references, kept outside the repository; read from the environment so spawned evaluation workers see --cache-dir too
+CSV_METRICS = ["SDR", "SIR", "SAR", "ISR"] # Metric column order of the result CSV files
+EVAL_WORKERS = max(1, (os.cpu_count() or 2) // 2) # BSS Eval processes; half the cores leaves room for the pipeline itself
 
 def get_result_files(prefix: str):
+    os.makedirs(results_dir, exist_ok=True)  # Create results directory if it doesn't exist; exist_ok=True avoids error if it already exists; Done here rather than at import
     csv_frames = os.path.join(results_dir, f"{prefix}_agg_frames_separation_quality_results.csv") # Complete path to aggregated frame-level separation quality results CSV file
     csv_tracks = os.path.join(results_dir, f"{prefix}_agg_tracks_separation_quality_results.csv") # Complete path to aggregated track-level separation quality results CSV file
 
-    if not os.path.exists(csv_frames):
-        with open(csv_frames, "w", newline="") as cf:
-            writer = csv.writer(cf)
-            writer.writerow(["Filename", "Stem", "SDR", "SIR", "SAR", "ISR"])
-
-    if not os.path.exists(csv_tracks):
-        with open(csv_tracks, "w", newline="") as cf:
-            writer = csv.writer(cf)
-            writer.writerow(["Stem", "SDR", "SIR", "SAR", "ISR"])
+    ensure_csv(csv_frames, ["Filename", "Stem", *CSV_METRICS])
+    ensure_csv(csv_tracks, ["Stem", *CSV_METRICS])
 
     return csv_frames, csv_tracks
 
 
-# === Convert Audio to Bytes Helper Function ===
-def _audio_to_bytes(audio: np.ndarray, sample_rate: int) -> bytes:
-    buffer = io.BytesIO()
-    sf.write(buffer, audio, sample_rate, format='WAV')
-    buffer.seek(0)
-    return buffer.read()
+# === Convert PCM Samples to Float32 Helper Function ===
+def _pcm_to_float32(waveform: np.ndarray) -> np.ndarray:
+    if waveform.dtype == np.int16: # Scale integer PCM to [-1, 1) like libsndfile does
+        waveform = waveform.astype(np.float32) / 32768.0
+    elif waveform.dtype == np.int32:
+        waveform = waveform.astype(np.float32) / 2147483648.0
+    elif waveform.dtype == np.uint8: # 8-bit WAV is unsigned with 128 as silence
+        waveform = (waveform.astype(np.float32) - 128.0) / 128.0
+    else:
+        waveform = waveform.astype(np.float32, copy=False)
+    return waveform[:, np.newaxis] if waveform.ndim == 1 else waveform # Mono files decode to 1D; keep (samples, channels)
+
+
+# === Encode Mixture Helper Function ===
+def _encode_mixture(track) -> WavStream:
+    """Function to decode a musdb mixture and encode it as a streamed WAV upload body, run in a worker thread"""
+    return wav_stream(_load_mixture(track), track.rate) # Convert musdb mixture from numpy.ndarray to 16-bit PCM
+
+
+# === Uploader Stage ===
+async def _uploader(client: httpx.AsyncClient, tracks: list, model: str, to_download: asyncio.Queue) -> None:
+    """Pipeline stage uploading each mixture for separation and handing the stem metadata to the downloader"""
+    if not tracks:
+        await to_download.put(None) # Nothing to encode; still release the downstream stages
+        return
+
+    loop = asyncio.get_running_loop()
+    with ThreadPoolExecutor(max_workers=1) as encoder: # One encode ahead is enough to hide it behind the server-side separation
+        next_encoding = loop.run_in_executor(encoder, _encode_mixture, tracks[0])
+        for i, track in enumerate(tracks):
+            print(f"\nstart processing file: {track.name}")
+            input_audio = await next_encoding
+            if i + 1 < len(tracks): # Start encoding track i+1 before posting track i so the encode overlaps the separation request
+                next_encoding = loop.run_in_executor(encoder, _encode_mixture, tracks[i + 1])
+            await _upload_track(client, track, input_audio, model, to_download)
+    await to_download.put(None) # Sentinel telling the downloader that all tracks were uploaded
+
+
+# === Upload Single Track Helper Function ===
+async def _upload_track(client: httpx.AsyncClient, track, input_audio: WavStream, model: str, to_download: asyncio.Queue) -> None:
+    """Function to post one encoded mixture for separation and queue its stem metadata for download"""
+    files = {'file': (f'{track.name}.wav', input_audio, 'audio/wav')}
+    upload_response = await client.post(f"/upload_audio/{model}", files=files)
+
+    if upload_response.status_code != 200:
+        raise RuntimeError(f"unexpected status code from upload_audio endpoint response: {upload_response.status_code} for file: {track.name}")
+
+    await to_download.put((track, orjson.loads(upload_response.content))) # orjson decodes the stem metadata faster than response.json(); put() blocks while the downloader is behind; bounded queue caps tracks in flight
+
+
+# === Decode Downloaded Stem Function ===
+def _decode_stem(content: bytearray) -> np.ndarray:
+    """Function to decode a downloaded WAV stem into a float32 (samples, channels) waveform"""
+    waveform, _ = decode_wav_bytes(content) # Stems are always WAV, so view the data chunk in place instead of decoding through a file object
+    return _pcm_to_float32(waveform) # Normalize to float32 (samples, channels) as sf.read would
+
+
+# === Download Stem Function ===
+async def _download_stem(client: httpx.AsyncClient, file_id: str, label: str) -> bytearray:
+    """Function to stream one stem into a buffer preallocated from Content-Length, so the body is never held twice"""
+    async with client.stream("GET", f"/download_audio/{file_id}") as download_resp:
+        if download_resp.status_code != 200:
+            raise RuntimeError(f"unexpected status code from download_audio endpoint response: {download_resp.status_code} for {label}")
+
+        content = bytearray(int(download_resp.headers.get("Content-Length", 0))) # The download endpoint always sends the WAV size
+        offset = 0
+        async for chunk in download_resp.aiter_raw(64 * 1024): # Raw bytes, so Content-Length describes exactly what arrives
+            end = offset + len(chunk)
+            if end <= len(content):
+                content[offset:end] = chunk
+            else: # Missing or short Content-Length; grow instead of failing
+                del content[offset:]
+                content += chunk
+            offset = end
+        del content[offset:] # Drop unused preallocated tail, if any
+    return content
+
+
+# === Downloader Stage ===
+async def _downloader(client: httpx.AsyncClient, to_download: asyncio.Queue, to_eval: asyncio.Queue) -> None:
+    """Pipeline stage downloading all stems of a track concurrently and handing the estimates to the evaluator"""
+    while (item := await to_download.get()) is not None:
+        track, data = item # Separation result metadata
+        contents = await asyncio.gather(*(_download_stem(client, stem_data["file_id"], f"{stem_name} of file: {track.name}") for stem_name, stem_data in data.items())) # Stems are independent so fetch them at once
+        decoded = await asyncio.gather(*(asyncio.to_thread(_decode_stem, content) for content in contents)) # Decode off the event loop so uploads and downloads of other tracks keep flowing
+        estimates = dict(zip(data.keys(), decoded)) # Estimated stem waveforms keyed by stem name
+        for stem_name in estimates:
+            if os.environ.get("SEP_DEBUG"): # Opt-in debug output; reading the reference shape here would decode the whole reference file just for printing
+                print(f"estimated stem {stem_name} of file: {track.name} shape: {estimates[stem_name].shape}")
+
+        await to_eval.put((track, estimates))
+    await to_eval.put(None) # Sentinel telling the evaluator that all tracks were downloaded
+
+
+# === Load Reference Stems Function ===
+def _load_references(track: musdb.MultiTrack, stems: list[str]) -> np.ndarray:
+    """Function to load reference stems as one (stems, samples, channels) float32 array, cached as .npy so re-runs skip the WAV decode"""
+    return np.stack([_load_reference(track, stem) for stem in stems]) # One file per stem, so the cache does not depend on which stems a model returns
+
+
+# === Load Cached Reference Stem Function ===
+def _load_reference(track: musdb.MultiTrack, stem: str) -> np.ndarray:
+    """Function to load one reference stem as a (samples, channels) float32 array from the .npy cache"""
+    return _load_cached(f"{track.name}.{stem}.npy", lambda: track.targets[stem].audio)
+
+
+# === Load Cached Mixture Function ===
+def _load_mixture(track: musdb.MultiTrack) -> np.ndarray:
+    """Function to load the mixture as a (samples, channels) float32 array from the same .npy cache as the references"""
+    return _load_cached(f"{track.name}.mixture.npy", lambda: track.audio)
+
+
+# === Load Cached Array Helper Function ===
+def _load_cached(file_name: str, decode) -> np.ndarray:
+    cache_path = os.path.join(cache_dir, file_name)
+    if os.path.exists(cache_path):
+        return np.load(cache_path, mmap_mode="r") # Memory-mapped; pages are read on demand and stay in the OS page cache between runs
+
+    array = np.asarray(decode(), dtype=np.float32) # musdb decodes on every .audio access, so decode once; MUSDB18-HQ is 16-bit PCM so float32 is lossless
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_path = f"{cache_path}.{os.getpid()}.tmp" # Per-process name, so concurrent writers never share a partial file
+    with open(tmp_path, "wb") as f:
+        np.save(f, array)
+    os.replace(tmp_path, cache_path) # Atomic; an interrupted run leaves only a stray .tmp file, never a truncated cache entry
+    return array
+
+
+# === Build Reference Cache Function ===
+def build_reference_cache(mus: musdb.DB) -> None:
+    """Function to decode every mixture and source stem once and store them as .npy, so benchmark runs only memory-map them"""
+    for track in mus.tracks:
+        _load_mixture(track)
+        for stem in track.sources: # vocals, drums, bass, other
+            _load_reference(track, stem)
+        print(f"cached file: {track.name}")
+
+
+# === Quantize Metric Values Function ===
+def _quantize(values: np.ndarray) -> list:
+    """Function to quantize framewise metric values to 5 decimals like TrackStore._q, with the non-finite check done once for the whole array"""
+    finite = np.isfinite(values)
+    return [Decimal(f"{value:.5f}") if is_finite else np.nan for value, is_finite in zip(values.tolist(), finite.tolist())] # Float formatting rounds the exact binary value half-to-even, the same as Decimal.quantize
+
+
+# === Evaluate Track Function ===
+def _evaluate_track(track: musdb.MultiTrack, estimates: dict[str, np.ndarray], output_dir: str | None = None, win: float = 1.0, hop: float = 1.0) -> museval.TrackStore:
+    """Function mirroring museval.eval_mus_track (v4 mode) but taking the references from the on-disk cache"""
+    stems = [stem for stem in track.targets if stem in estimates] # museval's order (the track's target order, e.g. vocals, drums, bass, other), so result CSVs line up with baseline runs; keys only, no audio is loaded
+    references = _load_references(track, stems)
+
+    estimate_stack = np.empty((len(stems), *estimates[stems[0]].shape), dtype=np.float32)
+    for i, stem in enumerate(stems):
+        estimate_stack[i] = estimates.pop(stem) # Release each downloaded stem as soon as it is copied into the stack
+
+    references, estimate_stack = museval.pad_or_truncate(references, estimate_stack) # museval.evaluate would copy both stacks again via np.array, so call its steps directly
+    SDR, ISR, SIR, SAR, _ = museval.metrics.bss_eval(references, estimate_stack, compute_permutation=False, window=int(win * track.rate), hop=int(hop * track.rate), framewise_filters=False, bsseval_sources_version=False) # All stems are scored jointly; SIR needs the other references as interferers
+
+    scores = museval.TrackStore(win=win, hop=hop, track_name=track.name)
+    for i, stem in enumerate(stems):
+        metrics = {"SDR": _quantize(SDR[i]), "SIR": _quantize(SIR[i]), "SAR": _quantize(SAR[i]), "ISR": _quantize(ISR[i])}
+        frames = [{"time": j * hop, "duration": win, "metrics": dict(zip(metrics, frame_metrics))} for j, frame_metrics in enumerate(zip(*metrics.values()))]
+        scores.scores["targets"].append({"name": stem, "frames": frames}) # Same layout TrackStore.add_target builds, without its per-value np.isinf and double Decimal quantize
+
+    if output_dir: # Save per-track json file like museval does
+        scores.validate()
+        subset_path = os.path.join(output_dir, track.subset)
+        os.makedirs(subset_path, exist_ok=True)
+        with open(os.path.join(subset_path, track.name) + ".json", "w+") as f:
+            f.write(scores.json)
+
+    return scores
+
+
+# === Track Scores to DataFrame Function ===
+def _scores_to_df(scores: museval.TrackStore) -> pd.DataFrame:
+    """Function building the same DataFrame as TrackStore.df directly from the in-memory scores, without its JSON encode/decode round trip"""
+    time, target, metric, score = [], [], [], []
+    for metric_name in ["SDR", "SAR", "ISR", "SIR"]: # Metric-major row order of museval.json2df
+        for target_data in scores.scores["targets"]:
+            frames = target_data["frames"]
+            time.extend(frame["time"] for frame in frames)
+            target.extend([target_data["name"]] * len(frames))
+            metric.extend([metric_name] * len(frames))
+            score.extend(float(frame["metrics"][metric_name]) for frame in frames) # Quantized Decimal (or NaN) to float, as parsing the JSON would
+    return pd.DataFrame({"time": time, "target": target, "metric": metric, "score": score, "track": scores.track_name})
+
+
+# === Evaluate Track in Worker Process Function ===
+def _evaluate_track_df(track: musdb.MultiTrack, estimates: dict[str, np.ndarray], output_dir: str | None = None) -> tuple[str, pd.DataFrame]:
+    """Function run in an evaluation worker process; Returns the scores as a DataFrame, which pickles back far cheaper than the Decimal-filled TrackStore"""
+    return track.name, _scores_to_df(_evaluate_track(track, estimates, output_dir))
+
+
+# === Evaluator Stage ===
+async def _evaluator(to_eval: asyncio.Queue, results: museval.EvalStore, pool: ProcessPoolExecutor) -> None:
+    """Pipeline stage scoring tracks in parallel worker processes so uploads and downloads keep running meanwhile"""
+    loop = asyncio.get_running_loop()
+    pending = set()
+
+    def collect(done: set) -> None:
+        error = None
+        for future in done:
+            if future.exception() is not None: # Keep the other finished tracks, then report the failure
+                error = error or future.exception()
+                continue
+            track_name, scores_df = future.result()
+            results.add_track(scores_df) # Add scores to EvalStore to have overall results in pandas dataframe and to aggregate metrics (median, mean / by frame, stem, tracks)
+            print(f"evaluated file: {track_name}")
+        if error is not None:
+            raise error
+
+    try:
+        while (item := await to_eval.get()) is not None:
+            track, estimates = item
+            pending.add(loop.run_in_executor(pool, _evaluate_track_df, track, estimates, results_dir)) # Evaluate separation quality track by track and save results to json files
+            if len(pending) >= EVAL_WORKERS: # Every worker is busy; wait for one before taking the next track so estimates do not pile up in the pool's call queue
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                collect(done)
+    finally: # Also on failure or cancellation, so every track already downloaded ends up in the partial results
+        while not to_eval.empty():
+            if (item := to_eval.get_nowait()) is not None:
+                pending.add(loop.run_in_executor(pool, _evaluate_track_df, *item, results_dir))
+        if pending:
+            done, _ = await asyncio.wait(pending)
+            collect(done)
+
+
+# === Run Separation Quality Pipeline Function ===
+async def _run_pipeline(tracks: list, model: str, results: museval.EvalStore) -> None:
+    """Function to run the uploader, downloader and evaluator stages concurrently connected by bounded queues"""
+    to_download = asyncio.Queue(maxsize=2) # Bounded queues keep at most a few tracks of waveforms resident
+    to_eval = asyncio.Queue(maxsize=2)
+    limits = httpx.Limits(max_connections=8, max_keepalive_connections=8, keepalive_expiry=120.0) # Room for all stem downloads of a track plus the next upload, kept alive across tracks
+    pool = ProcessPoolExecutor(max_workers=EVAL_WORKERS, mp_context=multiprocessing.get_context("spawn")) # Spawn rather than fork, this process already runs the event loop and encoder threads
+    async with httpx.AsyncClient(base_url=f"http://{get_main_address()}", timeout=None, limits=limits) as client:
+        stages = [
+            asyncio.create_task(_uploader(client, tracks, model, to_download)),
+            asyncio.create_task(_downloader(client, to_download, to_eval)),
+            asyncio.create_task(_evaluator(to_eval, results, pool)),
+        ]
+        try:
+            await asyncio.gather(*stages) # First failing stage raises here
+        finally:
+            for stage in stages:
+                stage.cancel() # Stop remaining stages, otherwise they would wait on their queues forever
+            await asyncio.gather(*stages, return_exceptions=True) # The evaluator first finishes the tracks already downloaded, so partial results keep them
+            pool.shutdown()
 
 
 # === Test Separation Quality Function ===
-def test_separation_quality(mus: musdb.DB, model: str, prefix: str) -> None:
+def test_separation_quality(mus: musdb.DB, model: str, prefix: str) -> museval.EvalStore:
     results = museval.EvalStore() # Initialize EvalStore to hold separation quality results
-    for track in mus.tracks:  # Limit to first n songs by adding [:n]
-        try: # Added try-except to allow saving partial results
-            print(f"\nstart processing file: {track.name}")
-            
-            input_audio_bytes = _audio_to_bytes(track.audio, track.rate) # Convert musdb mixture from numpy.ndarray to bytes
-            files = {'file': (f'{track.name}.wav', input_audio_bytes, 'audio/wav')}
-            upload_response = client.post(f"/upload_audio/{model}", files=files)
-
-            if upload_response.status_code != 200:
-                raise RuntimeError(f"unexpected status code from upload_audio endpoint response: {upload_response.status_code} for file: {track.name}")
-            
-            data = upload_response.json() # Get separation result metadata
-            estimates = {}
-            for stem_name, stem_data in data.items():
-                file_id = stem_data['file_id']
-                download_resp = client.get(f"/download_audio/{file_id}")
-                if download_resp.status_code == 200:
-                    buffer = io.BytesIO(download_resp.content)
-                    output_waveform, _ = sf.read(buffer)
-                    estimates[stem_name] = output_waveform # Store estimated stem waveform
-                    print(f"estimated stem {stem_name} of file: {track.name} shape: {estimates[stem_name].shape}")
-                    print(f"reference stem {stem_name} of file: {track.name} shape: {track.targets[stem_name].audio.shape}")
-                
-                else:
-                    raise RuntimeError(f"unexpected status code from download_audio endpoint response: {download_resp.status_code} for {stem_name} of file: {track.name}")
-            
-            scores = museval.eval_mus_track(track, estimates, output_dir=results_dir) # Evaluate separation quality track by track and save results to json files
-            results.add_track(scores) # Add scores to EvalStore to have overall results in pandas dataframe and to aggregate metrics (median, mean / by frame, stem, tracks)
-
-        except (httpx.RequestError, RuntimeError, Exception, KeyboardInterrupt) as e: # If the server stops or any error occurs during measurement, save collected results
-            print(f"evaluation failed for: {track.name} with error: {e}")
-            
-            if len(results.df) > 0:
-                print("saving results after interruption")
-                try:
-                    results.save(os.path.join(results_dir, f"{prefix}_separation_quality_results.pandas")) # Save EvalStore results for later analysis
-                except Exception as e:
-                    print(f"failed to save partial results, error: {e}")
-            else:
-                print("no results to save after interruption")
-            break
+    try: # Added try-except to allow saving partial results
+        asyncio.run(_run_pipeline(mus.tracks, model, results))  # Limit to first n songs by passing mus.tracks[:n]
+
+    except (httpx.RequestError, RuntimeError, Exception, KeyboardInterrupt) as e: # If the server stops or any error occurs during measurement, save collected results
+        print(f"evaluation interrupted with error: {e}")
+
+        if len(results.df) > 0:
+            print("saving results after interruption")
+        else:
+            print("no results to save after interruption")
 
     results.save(os.path.join(results_dir, f"{prefix}_separation_quality_results.pandas")) # Save EvalStore results for later analysis
+    return results
 
 
-# === Save Overall Results Aggregated by Frames to CSV Function ===
-def agg_frames_to_csv(csv_frames: str, prefix: str) -> None:
+# === Load Saved Results Function ===
+def _load_results(prefix: str) -> museval.EvalStore:
     results = museval.EvalStore() # Initialize EvalStore to hold separation quality results
     results_path = os.path.join(results_dir, f"{prefix}_separation_quality_results.pandas") # Path to saved EvalStore results
     results.load(results_path) # Load previously saved EvalStore results
+    return results
+
+
+# === Save Overall Results Aggregated by Frames to CSV Function ===
+def agg_frames_to_csv(csv_frames: str, prefix: str, results: museval.EvalStore | None = None) -> None:
+    if results is None: # Only reload from disk when aggregating an earlier run
+        results = _load_results(prefix)
     try:
         dataframe = results.agg_frames_scores() # Get aggregated frame-level scores (one metric per stem per track)
-        with open(csv_frames, 'a', newline="") as cf:
-            writer = csv.writer(cf)
-            for track in dataframe.index.get_level_values("track").unique(): # Iterate over unique tracks
-                track_df = dataframe.loc[track] # DataFrame for the specific track
-                for stem in track_df.index.get_level_values("target").unique(): # Iterate over unique stems for the track
-                    stem_df = track_df.loc[stem] # DataFrame for the specific stem
-                    sdr = stem_df.loc["SDR"] # Median SDR for the stem
-                    sir = stem_df.loc["SIR"] # Median SIR for the stem
-                    sar = stem_df.loc["SAR"] # Median SAR for the stem
-                    isr = stem_df.loc["ISR"] # Median ISR for the stem
-                    writer.writerow([track, stem, sdr, sir, sar, isr]) # Write results to CSV
-
-                    print(f"{track} {stem}: "f"SDR={sdr:.3f}, SIR={sir:.3f}, SAR={sar:.3f}, ISR={isr:.3f}")
+        table = dataframe.unstack("metric")[CSV_METRICS] # One (track, stem) row per stem with the median metrics as columns, in CSV column order
+        rows = [[track, stem, *scores] for (track, stem), scores in zip(table.index, table.to_numpy().tolist())] # Collect all rows first so the CSV is written in a single call
+        for track, stem, sdr, sir, sar, isr in rows:
+            print(f"{track} {stem}: "f"SDR={sdr:.3f}, SIR={sir:.3f}, SAR={sar:.3f}, ISR={isr:.3f}")
+
+        with open(csv_frames, 'a', newline="", buffering=1 << 16) as cf: # 64 KiB write buffer
+            csv.writer(cf).writerows(rows) # Write results to CSV
         
     except Exception as e:
         print(f"saving overall results aggregated by frames to csv failed with error: {e}")
 
 
 # === Save Overall Results Aggregated by Tracks to CSV Function ===
-def agg_tracks_to_csv(csv_tracks: str, prefix: str) -> None:
-    results = museval.EvalStore() # Initialize EvalStore to hold separation quality results
-    results_path = os.path.join(results_dir, f"{prefix}_separation_quality_results.pandas") # Path to saved EvalStore results
-    results.load(results_path) # Load previously saved EvalStore results
+def agg_tracks_to_csv(csv_tracks: str, prefix: str, results: museval.EvalStore | None = None) -> None:
+    if results is None: # Only reload from disk when aggregating an earlier run
+        results = _load_results(prefix)
     try:
         dataframe = results.agg_frames_tracks_scores() # Get aggregated track-level scores (one metric per stem)
-        with open(csv_tracks, 'a', newline="") as cf:
-            writer = csv.writer(cf)
-            for stem in dataframe.index.get_level_values("target").unique(): # Iterate over unique stems
-                stem_df = dataframe.loc[stem] # DataFrame for the specific stem
-                sdr = stem_df.loc["SDR"] # Median SDR for the stem
-                sir = stem_df.loc["SIR"] # Median SIR for the stem
-                sar = stem_df.loc["SAR"] # Median SAR for the stem
-                isr = stem_df.loc["ISR"] # Median ISR for the stem
-                writer.writerow([stem, sdr, sir, sar, isr]) # Write results to CSV
-
-                print(f"{stem}: "f"SDR={sdr:.3f}, SIR={sir:.3f}, SAR={sar:.3f}, ISR={isr:.3f}")
+        table = dataframe.unstack("metric")[CSV_METRICS] # One row per stem with the median metrics as columns, in CSV column order
+        rows = [[stem, *scores] for stem, scores in zip(table.index, table.to_numpy().tolist())] # Collect all rows first so the CSV is written in a single call
+        for stem, sdr, sir, sar, isr in rows:
+            print(f"{stem}: "f"SDR={sdr:.3f}, SIR={sir:.3f}, SAR={sar:.3f}, ISR={isr:.3f}")
+
+        with open(csv_tracks, 'a', newline="", buffering=1 << 16) as cf: # 64 KiB write buffer
+            csv.writer(cf).writerows(rows) # Write results to CSV
         
     except Exception as e:
         print(f"saving overall results aggregated by tracks to csv failed with error: {e}")
@@ -156,9 +355,15 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Separation Quality Test")
     parser.add_argument('--prefix', type=str, default=prefix, help='Filename prefix for result files')
     parser.add_argument('--model', type=str, default=model, help='Model to test ("scnet" or "dttnet")')
+    parser.add_argument('--build-cache', action='store_true', help='Only convert the MUSDB18-HQ test set to the .npy reference cache and exit')
+    parser.add_argument('--cache-dir', type=str, default=cache_dir, help='Directory of the .npy reference cache (default ~/.cache/musdb18hq_npy or $MUSDB_NPY_CACHE)')
     args = parser.parse_args()
+    cache_dir = os.environ["MUSDB_NPY_CACHE"] = args.cache_dir # Environment is inherited by the spawned evaluation workers
 
-    csv_frames, csv_tracks = get_result_files(args.prefix)
-    test_separation_quality(mus, args.model, args.prefix)
-    agg_frames_to_csv(csv_frames, args.prefix)
-    agg_tracks_to_csv(csv_tracks, args.prefix)
+    if args.build_cache:
+        build_reference_cache(get_mus())
+    else:
+        csv_frames, csv_tracks = get_result_files(args.prefix)
+        results = test_separation_quality(get_mus(), args.model, args.prefix)
+        agg_frames_to_csv(csv_frames, args.prefix, results) # Aggregate the in-memory scores; the saved file is only needed for later analysis
+        agg_tracks_to_csv(csv_tracks, args.prefix, results)
@@ -1,8 +1,12 @@
 import soundfile as sf
 import numpy as np
+import pandas as pd
 from pathlib import Path
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
+from perf_utils import get_main_address, ensure_csv, to_pcm16, pcm16_wav_stream
 import gdown
-import yaml, httpx, os, csv, io, math, random, time, requests, zipfile, argparse
+import httpx, os, csv, gc, math, random, time, requests, zipfile, argparse
 
 # --- Separation Speed Test ---
 
@@ -15,74 +19,76 @@ def get_database(root_path=None):
         root_path = Path(root_path) # Convert provided string to Path object
     root_path.mkdir(parents=True, exist_ok=True) # Create directory if it doesn't exist; parents=True to create any necessary parent directories, exist_ok=True avoids error if it already exists
 
-    if not any(root_path.iterdir()): # Check if directory is empty
-        zip_path = root_path / "database.zip" # Create a path for the downloaded zip file
+    zip_path = root_path / "database.zip" # Create a path for the downloaded zip file
+    marker_path = root_path / ".database_complete" # Written only once the archive is fully unpacked and removed
+    if not marker_path.exists() and (zip_path.exists() or not any(entry.suffix.lower() == ".flac" for entry in root_path.iterdir())): # A leftover archive means an earlier extraction was interrupted, so unpack it again even if some audio files are already there; an existing database of your own without the archive is used as it is
         url = "https://drive.google.com/uc?id=1NJrrlGa2HhB1VhbfOYZMLfSVXiPcanU8"
 
         print(f"Downloading database to {zip_path} ...")
-        gdown.download(url, str(zip_path), quiet=False) # Download the zip file from Google Drive; quiet=False to show progress bar in console
+        if not zip_path.exists(): # A complete archive from an earlier run that failed while unpacking is reused
+            gdown.download(url, str(zip_path), quiet=False, resume=True) # Download the zip file from Google Drive; quiet=False to show progress bar in console; resume=True continues an interrupted download instead of starting over
 
         print(f"Unpacking 'database.zip' to {root_path} ...")
         with zipfile.ZipFile(zip_path, 'r') as z: # Open the downloaded zip file for reading
             z.extractall(root_path) # Extract all contents to the root_path
         os.remove(zip_path) # Remove the zip file after extraction
+        marker_path.touch()
         
         print(f"Database successfully downloaded and unpacked to {root_path}")
 
     return str(root_path)
 
-# === Main Address Loaded from YAML File ===
-with open("workers/scnet/scnet1_config.yaml", "r") as f:
-    config = yaml.safe_load(f)
-main_address = config["main_address"]  # e.g., "127.0.0.1:8000"; If tests are run on the host (not inside Docker) the compose service name `main:8000` is not resolvable from the host
-
-if isinstance(main_address, str) and main_address.startswith("main:"): # When the config contains the compose service name, 
-    _, port = main_address.split(":", 1) # translate it to the host address so tests can connect to the published port (localhost)
-    main_address = f"127.0.0.1:{port}"
-
-
-# === Create HTTP Client ===
-client = httpx.Client(base_url=f"http://{main_address}", timeout=None)
+# === Create HTTP Client Function ===
+@lru_cache(maxsize=1)
+def get_client() -> httpx.Client:
+    """Function to create the shared HTTP client on first use rather than at import, so importing this module reads no config"""
+    return httpx.Client(
+        base_url=f"http://{get_main_address()}",
+        timeout=None,
+        transport=httpx.HTTPTransport( # Limits must be set on the transport; the client ignores them when a transport is passed
+            limits=httpx.Limits(max_keepalive_connections=4, max_connections=8, keepalive_expiry=120.0), # Keep the connection to main open across the whole sweep
+            retries=2, # Retries only failed connection attempts, never a request that reached the server
+        ),
+    )
 
 
 # === Prepare Results Directory and CSV Files for Separation Speed Test Results ===
 results_dir = "tests/performance/separation_speed"
-os.makedirs(results_dir, exist_ok=True)  # Create results directory if it doesn't exist; exist_ok=True avoids error if it already exists
 
 def get_result_files(prefix: str):
+    os.makedirs(results_dir, exist_ok=True)  # Create results directory if it doesn't exist; exist_ok=True avoids error if it already exists; Done here rather than at import
     csv_client = os.path.join(results_dir, f"{prefix}_client_separation_speed_results.csv") # Complete path to client separation speed results CSV file
     csv_model = os.path.join(results_dir, f"{prefix}_model_separation_speed_results.csv") # Complete path to model separation speed results CSV file
     agg_csv_client = os.path.join(results_dir, f"{prefix}_agg_client_separation_speed_results.csv") # Complete path to aggregated client separation speed results CSV file
     agg_csv_model = os.path.join(results_dir, f"{prefix}_agg_model_separation_speed_results.csv") # Complete path to aggregated model separation speed results CSV file
 
-    if not os.path.exists(csv_client):
-        with open(csv_client, "w", newline="") as cf:
-            writer = csv.writer(cf)
-            writer.writerow(["Filename", "Run idx", "Fragment [s]", "Time [s]"])
-
-    if not os.path.exists(csv_model):
-        with open(csv_model, "w", newline="") as cf:
-            writer = csv.writer(cf)
-            writer.writerow(["Filename", "Run idx", "Fragment [s]", "Time [s]"])
+    ensure_csv(csv_client, ["Filename", "Run idx", "Fragment [s]", "Time [s]"])
+    ensure_csv(csv_model, ["Filename", "Run idx", "Fragment [s]", "Time [s]"])
     
     return csv_client, csv_model, agg_csv_client, agg_csv_model
 
 
-# === Prepare Model with Warmup Function ===
-def warmup_separation() -> None:
-    sample_rate = 44100
+# === Warmup Audio Function ===
+WARMUP_SAMPLE_RATE = 44100
+
+@lru_cache(maxsize=1)
+def _warmup_pcm() -> np.ndarray:
+    """Function to build the 1 s warmup sine once as (samples, 1) 16-bit PCM; each request wraps it in its own stream"""
     duration = 1.0
     amplitude = 0.5
     frequency = 440.0
-    t = np.linspace(0, duration, int(sample_rate * duration), endpoint=False) # Time vector; endpoint=False to avoid an extra sample
-    sine_wave = amplitude * np.sin(2 * np.pi * frequency * t).astype(np.float32) # Sine wave generation; convert to float32 
-    buffer = io.BytesIO()
-    sf.write(buffer, sine_wave[:, np.newaxis], sample_rate, format='WAV') # np.newaxis to make it 2D (samples, channels)
-    buffer.seek(0)
-    audio_bytes = buffer.read()
-    files = {'file': ('warmup.wav', audio_bytes, 'audio/wav')}
+    sine_wave = np.arange(int(WARMUP_SAMPLE_RATE * duration), dtype=np.float32) # Sample index; built in float32 in place, no float64 time vector
+    sine_wave *= np.float32(2 * np.pi * frequency / WARMUP_SAMPLE_RATE) # Phase per sample
+    np.sin(sine_wave, out=sine_wave)
+    sine_wave *= np.float32(amplitude) # Kept a sine rather than silence, so the model sees a non-degenerate input
+    return to_pcm16(sine_wave[:, np.newaxis]) # np.newaxis to make it 2D (samples, channels)
+
+
+# === Prepare Model with Warmup Function ===
+def warmup_separation() -> None:
     for model in ["scnet", "dttnet"]:
-        response = client.post(f"/upload_audio/{model}", files=files)
+        upload_files = [('file', ('warmup.wav', pcm16_wav_stream(_warmup_pcm(), WARMUP_SAMPLE_RATE), 'audio/wav'))] # Fresh stream per request, so no request depends on where the previous one left the file position
+        response = get_client().post(f"/upload_audio/{model}", files=upload_files)
         if response.status_code != 200:
             print(f"warmup request failed with status code: {response.status_code}")
         else:
@@ -93,15 +99,15 @@ def warmup_separation() -> None:
 def _collect_files(db_path: str) -> list[str]:
     if not os.path.exists(db_path):
         raise FileNotFoundError(f"database path does not exist: {db_path}")
-    files = [os.path.join(db_path, f) for f in os.listdir(db_path) if f.lower().endswith(".flac")] # Collect all .flac files from database path and return full paths
-    files.sort() # Sort files by filename for consistent order
+    with os.scandir(db_path) as entries: # DirEntry name, path and file type come from the directory read itself, no extra stat per file
+        files = sorted(entry.path for entry in entries if entry.is_file() and entry.name.lower().endswith(".flac")) # Collect all .flac files from database path as full paths, sorted by filename for consistent order
     return files # Limit to first n songs by adding [:n]
 
 
 # === Load Audio Fragments Function ===
-def _load_audio_fragments(filename: str, file_path: str) -> list[int]:
-    waveform, sample_rate = sf.read(file_path, dtype="float32")
-    samples_num = waveform.shape[0]
+def _load_audio_fragments(filename: str, audio_file: sf.SoundFile) -> list[int]:
+    sample_rate = audio_file.samplerate
+    samples_num = audio_file.frames # Known from the header; samples are read per clip, so the whole track is never held in memory
     duration = samples_num / sample_rate
     max_length_sec = int(math.floor(duration / 30.0) * 30) # Divide duration into segments of 30 seconds, round down to get max length divisible by 30 and multiply by 30 to get max length in seconds
     if max_length_sec < 30:
@@ -110,128 +116,160 @@ def _load_audio_fragments(filename: str, file_path: str) -> list[int]:
     fragments = list(range(30, max_length_sec + 1, 30)) # Create list of fragment lengths: 30,60,... up to max_length_sec (exclusive so +1)
     print(f"loaded file: {filename}, duration: {duration:.2f}s, fragments: {fragments}")
 
-    return fragments, waveform, sample_rate, samples_num
-
-
-# === Convert Waveform to Bytes Function ===
-def _convert_to_bytes(waveform, sample_rate):
-    buffer = io.BytesIO()
-    sf.write(buffer, waveform, sample_rate, format="WAV")
-    buffer.seek(0)
-    return buffer.read()
+    return fragments, sample_rate, samples_num
+
+
+# === Build Upload Request Function ===
+def _build_request(audio_file: sf.SoundFile, model: str, filename: str, start: int, fragment_samples: int, raw: bool, out: np.ndarray | None = None) -> tuple[str, dict]:
+    """Function to read one clip from the open audio file, optionally into a reused buffer, and return the endpoint and keyword arguments for its upload request"""
+    sample_rate = audio_file.samplerate
+    out = None if out is None else out[:fragment_samples] # Leading rows of a C-contiguous buffer, so the clip stays contiguous
+    audio_file.seek(start)
+    if raw: # Opt-in fast path: interleaved float32 samples as the body, no WAV container to encode here or decode on main
+        clip = audio_file.read(fragment_samples, dtype="float32", always_2d=True, out=out) # Decode only this clip
+        return f"/upload_audio_raw/{model}", {"content": clip.tobytes(), "headers": {"X-Sample-Rate": str(sample_rate), "X-Channels": str(clip.shape[1]), "X-Filename": f"{filename}.wav"}}
+    clip = audio_file.read(fragment_samples, dtype="int16", always_2d=True, out=out) # Decode only this clip; uploads are 16-bit PCM, so let libsndfile decode straight to int16
+    audio_body = pcm16_wav_stream(clip, sample_rate) # Streamed in 64 KiB chunks straight from the sample array
+    return f"/upload_audio/{model}", {"files": [('file', (filename, audio_body, 'audio/wav'))]} # Separate name from the collected audio_files list
+
+
+# === Timed Upload Request Function ===
+def _timed_post(request: tuple[str, dict]) -> tuple[httpx.Response, int]:
+    """Function to send one upload request and return the response with the client-side duration in nanoseconds"""
+    endpoint, request_kwargs = request
+    t0_client = time.perf_counter_ns() # Monotonic, high resolution and unaffected by clock adjustments
+    upload_response = get_client().post(endpoint, **request_kwargs)
+    t1_client = time.perf_counter_ns()
+    return upload_response, t1_client - t0_client
+
+
+# === Prefetch Next Request Function ===
+def _prefetched(requests_iter, pool: ThreadPoolExecutor):
+    """Function to yield requests from a lazy iterable while the following one (clip read and decode) is built in the pool's thread"""
+    requests_iter = iter(requests_iter)
+    pending = pool.submit(next, requests_iter, None)
+    try:
+        while (request := pending.result()) is not None:
+            pending = pool.submit(next, requests_iter, None) # Overlaps the next clip's decode with this request's round trip
+            yield request
+    finally:
+        pending.result() # Never leave a read in flight on the shared SoundFile, e.g. when the run loop breaks early
 
 
 # === Test Separation Speed Function ===
-def test_separation_speed(model: str, prefix: str) -> list[tuple[str, dict[int, list[float]]]]:
+def test_separation_speed(model: str, prefix: str, raw: bool = False, min_gap: float = 0.05) -> list[tuple[str, dict[int, list[int]]]]:
     results_per_song_client = []  
     results_per_song_model = []  
-    files = _collect_files(db_path)
-    if not files:
+    audio_files = _collect_files(db_path)
+    if not audio_files:
         raise FileNotFoundError(f"no audio files found in database path: {db_path}")
+    next_ok = 0.0 # Monotonic time before which the next request is held back
+    pool = ThreadPoolExecutor(max_workers=1) # Reads the next clip while the current request is in flight
 
-    for file_path in files:
+    for file_path in audio_files:
         filename = Path(file_path).stem
-        fragments, waveform, sample_rate, samples_num = _load_audio_fragments(filename, file_path)
-
-        timings_client = {f: [] for f in fragments} # dict[fragment_length, list[client times]]; initialize empty lists for each fragment length
-        timings_model = {f: [] for f in fragments}  # dict[fragment_length, list[model times]]; initialize empty lists for each fragment length
-        rng = random.Random(filename)  # Seed random number generator with filename for reproducibility
-        for fragment in fragments:
-            fragment_samples = int(fragment * sample_rate)
-            for i in range(5): # Set number of runs, now: 5 measurements per fragment length
+        with sf.SoundFile(file_path) as audio_file: # One handle per file, reused for every clip
+            fragments, sample_rate, samples_num = _load_audio_fragments(filename, audio_file)
+
+            timings_client = {f: [] for f in fragments} # dict[fragment_length, list[client times]]; initialize empty lists for each fragment length
+            timings_model = {f: [] for f in fragments}  # dict[fragment_length, list[model times]]; initialize empty lists for each fragment length
+            rng = random.Random(filename)  # Seed random number generator with filename for reproducibility
+            clip_buffers = np.empty((2, int(fragments[-1] * sample_rate), audio_file.channels), dtype=np.float32 if raw else np.int16) # Runs alternate between two buffers sized for the longest fragment: one being sent, one being prefetched
+            for fragment in fragments:
+                fragment_samples = int(fragment * sample_rate)
                 max_start_idx = samples_num - fragment_samples # Maximum possible start index for fragment
-                if max_start_idx <= 0:
-                    start = 0
-                else:
-                    start = rng.randint(0, max_start_idx)
-
-                clip = waveform[start:start + fragment_samples]
-                audio_bytes = _convert_to_bytes(clip, sample_rate)
-                files = {'file': (filename, audio_bytes, 'audio/wav')}
-
-                try: # Added try-except to allow saving partial results
-                    t0_client = time.time()
-                    upload_response = client.post(f"/upload_audio/{model}", files=files)
-                    t1_client = time.time()
-                    if upload_response.status_code != 200:
-                        raise RuntimeError(f"unexpected status code from upload_audio endpoint response: {upload_response.status_code} for file: {filename}, fragment: {fragment}s")
-
-                    delta_t_client = t1_client - t0_client
-                    timings_client[fragment].append(delta_t_client)
-                    print(f"file: {filename}, fragment: {fragment}s, run: {i+1}, delta_t_client: {delta_t_client:.4f}s")
-
-                    t0_model = upload_response.headers.get("Separation-Start")
-                    t1_model = upload_response.headers.get("Separation-End")
-                    if t0_model is not None and t1_model is not None:
+                batch = ( # Set number of runs, now: 5 measurements per fragment length; clips are read lazily, in the main thread, as requests are issued
+                    _build_request(audio_file, model, filename, 0 if max_start_idx <= 0 else rng.randint(0, max_start_idx), fragment_samples, raw, clip_buffers[run % 2])
+                    for run in range(5)
+                )
+                runs = map(_timed_post, _prefetched(batch, pool)) # Runs are sent one by one while the next clip is read in the background
+                for i in range(5):
+                    try: # Added try-except to allow saving partial results
+                        if (delay := next_ok - time.monotonic()) > 0:
+                            time.sleep(delay) # Only the part of the gap not already spent on bookkeeping and prefetching
+                        gc.disable() # Keep collector pauses out of the timed request
                         try:
-                            delta_t_model = float(t1_model) - float(t0_model)
-                            timings_model[fragment].append(delta_t_model)
-                            print(f"file: {filename}, fragment: {fragment}s, run: {i+1}, delta_t_model: {delta_t_model:.4f}s")
-                        except Exception as e:
-                            raise RuntimeError(f"inference timestamp parsing failed for file: {filename}, fragment: {fragment}s, run: {i+1}, with error: {e}")
-                    else:
-                        raise RuntimeError(f"inference timestamps not provided for file: {filename}, fragment: {fragment}s, run: {i+1}")
-                    time.sleep(0.5) # Short sleep to avoid overwhelming the server
-
-                except (httpx.RequestError, RuntimeError, Exception, KeyboardInterrupt) as e: # If the server stops or any error occurs during measurement, save collected results
-                    print(f"measurement interrupted for file {filename}, fragment {fragment}s, run {i+1}: {e}")
-
-                    if results_per_song_client or results_per_song_model:
-                        print("saving results after interruption")
-                        return results_per_song_client, results_per_song_model
+                            upload_response, delta_t_client = next(runs) # Nanoseconds; converted to seconds only when written to CSV
+                        finally:
+                            gc.enable()
+                        if upload_response.status_code != 200:
+                            raise RuntimeError(f"unexpected status code from upload_audio endpoint response: {upload_response.status_code} for file: {filename}, fragment: {fragment}s")
+
+                        timings_client[fragment].append(delta_t_client)
+                        print(f"file: {filename}, fragment: {fragment}s, run: {i+1}, delta_t_client: {delta_t_client / 1e9:.4f}s")
+
+                        separation_duration = upload_response.headers.get("Separation-Duration-Ns")
+                        if separation_duration is not None:
+                            try:
+                                delta_t_model = int(separation_duration) # Server reports nanoseconds, like the client timings
+                                timings_model[fragment].append(delta_t_model)
+                                print(f"file: {filename}, fragment: {fragment}s, run: {i+1}, delta_t_model: {delta_t_model / 1e9:.4f}s")
+                            except Exception as e:
+                                raise RuntimeError(f"inference duration parsing failed for file: {filename}, fragment: {fragment}s, run: {i+1}, with error: {e}")
+                        else:
+                            raise RuntimeError(f"inference duration not provided for file: {filename}, fragment: {fragment}s, run: {i+1}")
+                        next_ok = time.monotonic() + min_gap # Minimum gap before the next request to avoid overwhelming the server
+
+                    except (httpx.RequestError, RuntimeError, Exception, KeyboardInterrupt) as e: # If the server stops or any error occurs during measurement, save collected results
+                        print(f"measurement interrupted for file {filename}, fragment {fragment}s, run {i+1}: {e}")
+
+                        if results_per_song_client or results_per_song_model:
+                            print("saving results after interruption")
+                            pool.shutdown()
+                            return results_per_song_client, results_per_song_model
                     
-                    else:
-                        print("no results to save after interruption")
-                        break
+                        else:
+                            print("no results to save after interruption")
+                            break
                 
         results_per_song_client.append((filename, timings_client))
         results_per_song_model.append((filename, timings_model))
 
+    pool.shutdown()
     return results_per_song_client, results_per_song_model
     
 
 # === Save Results to CSV Function ===
-def results_to_csv(csv_file: str, results_per_song: list[tuple[str, dict[int, list[float]]]]) -> None:
-    with open(csv_file, "a", newline="") as cf:
-        writer = csv.writer(cf)
-        for filename, timings in results_per_song:
-            for fragment in sorted(timings.keys()):
-                runs = timings[fragment]
-                for run_idx, result in enumerate(runs, start=1):
-                    writer.writerow([filename, run_idx, fragment, f"{result:.6f}"])
-                    print(f"saved to CSV: {filename}, fragment: {fragment}s, run: {run_idx}, time: {result:.6f}s")
+def results_to_csv(csv_file: str, results_per_song: list[tuple[str, dict[int, list[int]]]], verbose: bool = False) -> None:
+    rows = (
+        [filename, run_idx, fragment, f"{result_ns / 1e9:.6f}"] # Timings are kept in nanoseconds until here
+        for filename, timings in results_per_song
+        for fragment in sorted(timings)
+        for run_idx, result_ns in enumerate(timings[fragment], start=1)
+    ) # Generator consumed by writerows in C; no row list is built unless it is echoed
+    if verbose:
+        rows = list(rows) # Kept for the echo below
+    with open(csv_file, "a", newline="", buffering=1 << 20) as cf: # 1 MiB write buffer
+        csv.writer(cf).writerows(rows)
+
+    if verbose: # Per-row echo only on request; one stdout write per row slows down large sweeps
+        print("\n".join(f"saved to CSV: {filename}, fragment: {fragment}s, run: {run_idx}, time: {result}s" for filename, run_idx, fragment, result in rows))
+    num_rows = sum(len(runs) for _, timings in results_per_song for runs in timings.values())
+    print(f"saved {num_rows} rows to CSV: {csv_file}")
     
 
 # === Aggregate Results to CSV Function ===
-def aggregate_results_to_csv(csv_input: str, csv_output: str) -> None:
-    agg = {}  # dict[(filename, fragment_length), list of times]
+def aggregate_results_to_csv(csv_input: str, csv_output: str, verbose: bool = False) -> None:
     if not os.path.exists(csv_input):
         print(f"csv file does not exist: {csv_input}")
         return
 
-    with open(csv_input, "r", newline="") as incf:
-        reader = csv.reader(incf)
-        header = next(reader, None) # Skip header row so we only process data rows
-        for row in reader:
-            try:
-                filename = row[0] 
-                fragment = float(row[2])
-                time_str = row[3]
-                t = float(time_str)
-                key = (filename, int(fragment)) # Building a grouping key based on filename and fragment length with fragment as int for consistency
-                agg.setdefault(key, []).append(t) # Check if key exists, if not create an empty list, then append time to the list for this (filename, fragment) key
-            except Exception as e:
-                print(f"failed to process row: {row}, with error: {e}")
-
-    with open(csv_output, "w", newline="") as outcf:
-        writer = csv.writer(outcf)
-        writer.writerow(["Filename", "Fragment [s]", "Mean Time [s]", "RTF"])
-        for (filename, fragment) in sorted(agg.keys()): # Sort by filename and fragment length for consistent, deterministic output order
-            runs = agg[(filename, fragment)]
-            mean_time = sum(runs) / len(runs)
-            rtf = mean_time / float(fragment)
-            writer.writerow([filename, f"{fragment}", f"{mean_time:.6f}", f"{rtf:.6f}"])
-            print(f"agg saved: {filename}, fragment: {fragment}s, mean: {mean_time:.6f}s, rtf: {rtf:.6f}")
+    df = pd.read_csv(csv_input, dtype={"Filename": str}) # Keep filenames as text even when they look like numbers
+    df["Fragment [s]"] = pd.to_numeric(df["Fragment [s]"], errors="coerce") # Malformed values become NaN instead of failing the whole file
+    df["Time [s]"] = pd.to_numeric(df["Time [s]"], errors="coerce")
+    invalid = df[["Fragment [s]", "Time [s]"]].isna().any(axis=1)
+    if invalid.any():
+        print(f"skipped {int(invalid.sum())} invalid rows in: {csv_input}")
+    df = df[~invalid].astype({"Fragment [s]": int}) # Fragment as int for consistent grouping keys
+
+    agg = df.groupby(["Filename", "Fragment [s]"], as_index=False)["Time [s]"].mean() # Sorted by filename and fragment length for consistent, deterministic output order
+    agg = agg.rename(columns={"Time [s]": "Mean Time [s]"})
+    agg["RTF"] = agg["Mean Time [s]"] / agg["Fragment [s]"]
+    agg.to_csv(csv_output, index=False, float_format="%.6f", lineterminator="\r\n") # Header and all aggregated rows in a single write; CRLF like the csv module writes
+
+    if verbose: # Per-row echo only on request
+        print("\n".join(f"agg saved: {filename}, fragment: {fragment}s, mean: {mean_time:.6f}s, rtf: {rtf:.6f}" for filename, fragment, mean_time, rtf in agg.itertuples(index=False)))
+    print(f"saved {len(agg)} aggregated rows to CSV: {csv_output}")
     
 
 # === Main Execution Block ===
@@ -244,13 +282,23 @@ if __name__ == "__main__":
     parser.add_argument('--prefix', type=str, default=prefix, help='Filename prefix for result files')
     parser.add_argument('--model', type=str, default=model, help='Model to test ("scnet" or "dttnet")')
     parser.add_argument('--db', type=str, default=db_path, help='Path to database directory')
+    parser.add_argument('--raw', action='store_true', help='Upload raw float32 samples to /upload_audio_raw instead of WAV files')
+    parser.add_argument('--min-gap', type=float, default=0.05, help='Minimum pause in seconds between a response and the next request (default 0.05)')
+    parser.add_argument('--warmup-only', action='store_true', help='Only send the warmup requests to both models and exit')
+    parser.add_argument('--verbose', action='store_true', help='Print every row written to the result CSV files')
     args = parser.parse_args()
 
+    if args.warmup_only:
+        with get_client():
+            warmup_separation()
+        raise SystemExit(0)
+
     db_path = get_database(args.db)
-    warmup_separation()
-    csv_client, csv_model, agg_csv_client, agg_csv_model = get_result_files(args.prefix)
-    results_client, results_model = test_separation_speed(args.model, args.prefix)
-    results_to_csv(csv_client, results_client)
-    results_to_csv(csv_model, results_model)
-    aggregate_results_to_csv(csv_client, agg_csv_client)
-    aggregate_results_to_csv(csv_model, agg_csv_model)
+    with get_client(): # Close pooled connections once all requests are done
+        warmup_separation()
+        csv_client, csv_model, agg_csv_client, agg_csv_model = get_result_files(args.prefix)
+        results_client, results_model = test_separation_speed(args.model, args.prefix, args.raw, args.min_gap)
+    results_to_csv(csv_client, results_client, args.verbose)
+    results_to_csv(csv_model, results_model, args.verbose)
+    aggregate_results_to_csv(csv_client, agg_csv_client, args.verbose)
+    aggregate_results_to_csv(csv_model, agg_csv_model, args.verbose)
@@ -5,6 +5,23 @@ import httpx, asyncio, time
 
 worker_register_router = APIRouter() # Create API router for worker register routes
 logger = get_logger(__name__) # Logger for worker_register_routes module
+register_client: httpx.AsyncClient | None = None # Shared HTTP client, created in the worker lifespan so it belongs to the running event loop
+
+
+# === Open Register Client Function ===
+def open_register_client() -> None:
+    """Function to create the shared registration HTTP client on worker startup"""
+    global register_client
+    register_client = httpx.AsyncClient(timeout=10, limits=httpx.Limits(max_keepalive_connections=4, keepalive_expiry=30.0)) # Timeout per request; keep-alive connections to main app are reused across retries and registrations
+
+
+# === Close Register Client Function ===
+async def close_register_client() -> None:
+    """Function to close the shared registration HTTP client on worker shutdown"""
+    global register_client
+    if register_client is not None:
+        await register_client.aclose()
+        register_client = None
 
 
 # === Register Request Endpoint ===
@@ -18,8 +35,7 @@ async def register_request(data: WorkerConfig) -> None:
     )
     
     try:
-        async with httpx.AsyncClient(timeout=10) as client: # HTTP client with timeout
-            response = await client.post(f"http://{data.main_address}/register_worker", json=worker_data.model_dump()) # Send registration request to main app; model_dump() converts Pydantic model to Python dict
+        response = await register_client.post(f"http://{data.main_address}/register_worker", json=worker_data.model_dump()) # Send registration request to main app; model_dump() converts Pydantic model to Python dict
         if response.status_code == 200:
             logger.info(action="registration_request", status="success", data={"worker_id": data.worker_id, "model_type": data.model_type, "address": data.worker_address})
         else:
@@ -45,8 +61,7 @@ async def try_register(worker_id: str, model_type: str, worker_address: str, mai
     last_error = None
     while (time.time() - start_time) < deadline: # Retry loop with deadline for more robust checking if main app is reachable
         try: # Check if the main app's /register_worker endpoint is reachable before sending registration request
-            async with httpx.AsyncClient(timeout=10) as client: # HTTP client with timeout
-                response = await client.post(f"http://{main_address}/register_worker", json=worker_data.model_dump()) # Send registration request to main app; model_dump() converts Pydantic model to Python dict
+            response = await register_client.post(f"http://{main_address}/register_worker", json=worker_data.model_dump()) # Send registration request to main app; model_dump() converts Pydantic model to Python dict
             if response.status_code == 200:
                 logger.info(action="registration_attempt", status="success", data={"worker_id": worker_id, "model_type": model_type, "address": worker_address})
                 return # Exit loop on successful registration
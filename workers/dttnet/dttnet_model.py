@@ -2,10 +2,11 @@ from fastapi import UploadFile, HTTPException
 from src.dp_tdf.dp_tdf_net import DPTDFNet
 from src.evaluation.separate import no_overlap_inference, overlap_inference  
 from app.utils.logging_utils import get_logger
+from workers.utils.worker_utils import decode_audio
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 import numpy as np
-import soundfile as sf
-import torch, yaml, asyncio, importlib.util, os, io, time
+import torch, yaml, asyncio, importlib.util, os, time, contextlib
 
 logger = get_logger(__name__) # Logger for DTTNet Model
 
@@ -13,9 +14,11 @@ logger = get_logger(__name__) # Logger for DTTNet Model
 # === DTTNet Model Management Class ===
 class DTTNetModel:
 	"""Class to manage DTTNet model loading and inference."""
-	def __init__(self, worker_id: str) -> None:
+	def __init__(self, worker_id: str, precision: str | None = None, compile: bool = False, parallel_sources: bool = False) -> None:
 		self.worker_id = worker_id
-		self.inference_lock = asyncio.Lock()
+		self.compile = compile # Opt-in torch.compile of each source model; only applied on CUDA
+		self.parallel_sources = parallel_sources # Opt-in: run the source models concurrently on separate CUDA streams; needs GPU memory for all four at once
+		self.inference_lock = asyncio.Lock() # One separation at a time on the device
 		
 		spec = importlib.util.find_spec("src.evaluation") # Check if DTTNet package is importable
 		if spec is None:
@@ -29,6 +32,9 @@ class DTTNetModel:
 
 		self.sources = {"bass", "drums", "other", "vocals"}  # Default targets
 		self.models: dict[str, DPTDFNet] = {}
+		self._inf_ck: dict[str, int] = {} # Inference chunk size per source, resolved once at load time
+		self._streams: dict[str, torch.cuda.Stream] = {} # CUDA stream per source when sources run in parallel
+		self._source_pool: ThreadPoolExecutor | None = None
 		self.loaded = False
 		
 		with open(self.infer_config_path, "r") as f: # Load DTTNet config file
@@ -37,6 +43,8 @@ class DTTNetModel:
 		self.batch_size = infer_cfg.get("batch_size", 4)
 		self.double_chunk = infer_cfg.get("double_chunk", False)
 		self.overlap_add = infer_cfg.get("overlap_add", None)
+		if self.overlap_add is not None:
+			os.makedirs(self.overlap_add["tmp_root"], exist_ok=True) # Created once here instead of checked on every inference
 
 		def _select_device(cfg_device: str | None) -> torch.device: # Helper function to select device
 			try:
@@ -50,78 +58,119 @@ class DTTNetModel:
 				return torch.device("cpu")
 
 		self.device = _select_device(infer_cfg.get("device"))
+		if self.device.type == "cuda":
+			torch.backends.cudnn.benchmark = True # Inference always runs fixed-size chunks (chunk_size per model), so the conv algorithm search happens once per shape and is reused
+
+		self.autocast_dtype: torch.dtype | None = None # Opt-in mixed precision: "bf16" or "fp16"; anything else keeps float32
+		if self.device.type == "cuda" and precision in ("bf16", "fp16"):
+			self.autocast_dtype = torch.bfloat16 if precision == "bf16" and torch.cuda.is_bf16_supported() else torch.float16 # GPUs without bf16 support fall back to fp16
 
     # === Model Loading Function ===
 	async def load_model(self) -> None:
 		"""Instantiate DTTNet checkpoints defined in the config file."""
-		for source in self.sources: # Load model for each source
-			model_config_path = os.path.join(self.model_config_path, f"{source}.yaml")
-			checkpoint_path = os.path.join(self.checkpoint_path, f"{source}.ckpt")
-
-			with open(model_config_path, "r") as f: # Load DTTNet config file
-				model_cfg = yaml.safe_load(f)
-
-			target_path = model_cfg.pop("_target_", "src.dp_tdf.dp_tdf_net.DPTDFNet") # Delete _target_ from config to avoid issues
-			model = DPTDFNet(**model_cfg) # Unpack model configuration and create DTTNet model instance
-			checkpoint = torch.load(checkpoint_path, map_location=self.device) # Load model checkpoint file and map to selected device
-			state_dict = checkpoint.get("state_dict", checkpoint) # Get state_dict (actual weights) from checkpoint
-			model.load_state_dict(state_dict, strict=True) # Load weights into model instance ensuring all keys match (strict=True)
-			model = model.to(self.device) # Move model to the selected device
-			model.eval() # Set model to evaluation mode
-
-			self.models[source] = model # Store model instance in the models dictionary keyed by source name
+		sources = list(self.sources) # Fix the iteration order so results can be matched back to sources
+		models = await asyncio.gather(*(asyncio.to_thread(self._load_source_model, source) for source in sources)) # Load all checkpoints concurrently in threads; file reads and deserialization release the GIL and no longer block the event loop
+		self.models = dict(zip(sources, models)) # Store model instances keyed by source name
+		self._inf_ck = {source: model.inference_chunk_size if self.double_chunk else model.chunk_size for source, model in self.models.items()} # Fixed per model, so looked up once instead of per request
+		if self.parallel_sources and self.device.type == "cuda" and self.overlap_add is None: # Overlap-add writes to a shared temp dir, so it stays sequential
+			self._streams = {source: torch.cuda.Stream(device=self.device) for source in self.models}
+			self._source_pool = ThreadPoolExecutor(max_workers=len(self.models), thread_name_prefix="dttnet-source")
+		if self.autocast_dtype is not None: # The external inference helpers were not written for reduced precision, so check one separation before serving with it
+			try:
+				await asyncio.to_thread(self._run_separation, np.zeros((2, 44100), dtype=np.float32), 44100) # 1 s of stereo silence, (channels, samples) like prepared mixes
+			except Exception as e:
+				logger.warning(action="precision_check", status="fallback", data={"worker_id": self.worker_id, "precision": str(self.autocast_dtype), "fallback_precision": "float32", "error": str(e)})
+				self.autocast_dtype = None
+		if self.compile and self.device.type == "cuda": # Pay compilation before serving; chunks always have the same shape and only the batch dimension varies (1..batch_size), so this covers every shape a request can produce
+			warmup_samples = self.batch_size * max(self._inf_ck.values()) # At least one full batch of chunks plus a partial one: the full batch compiles static kernels, the partial batch recompiles once with a dynamic batch dimension
+			await asyncio.to_thread(self._run_separation, np.zeros((2, warmup_samples), dtype=np.float32), 44100)
 
 		logger.info(action="model_loading", status="success",data={"worker_id": self.worker_id})
 		self.loaded = True  # Mark models as loaded
 
+	# === Single Source Model Loading Function ===
+	def _load_source_model(self, source: str) -> DPTDFNet:
+		"""Build one DTTNet model and load its checkpoint weights."""
+		model_config_path = os.path.join(self.model_config_path, f"{source}.yaml")
+		checkpoint_path = os.path.join(self.checkpoint_path, f"{source}.ckpt")
+
+		with open(model_config_path, "r") as f: # Load DTTNet config file
+			model_cfg = yaml.safe_load(f)
+
+		target_path = model_cfg.pop("_target_", "src.dp_tdf.dp_tdf_net.DPTDFNet") # Delete _target_ from config to avoid issues
+		model = DPTDFNet(**model_cfg) # Unpack model configuration and create DTTNet model instance
+		checkpoint = torch.load(checkpoint_path, map_location=self.device, mmap=True, weights_only=True) # Memory-map the checkpoint file so tensors are paged in as they are copied instead of read whole first
+		state_dict = checkpoint.get("state_dict", checkpoint) # Get state_dict (actual weights) from checkpoint
+		model.load_state_dict(state_dict, strict=True) # Load weights into model instance ensuring all keys match (strict=True)
+		model = model.to(self.device) # Move model to the selected device
+		model.eval() # Set model to evaluation mode
+		if self.compile and self.device.type == "cuda": # Fixed-shape chunks make the forward pass a good fit for CUDA graphs; on CPU the eager model is kept
+			model = torch.compile(model, mode="reduce-overhead", dynamic=None) # "reduce-overhead" records CUDA graphs and replays them per chunk; dynamic=None keeps the full batch static and lets the first smaller batch recompile with a dynamic batch dimension, so at most batch_size graphs are recorded per source
+		return model
+
     # === Inference Function ===
-	async def perform_inference(self, file: UploadFile)-> tuple[dict[str, np.ndarray], dict[str, int], float, float]:
+	async def perform_inference(self, file: UploadFile)-> tuple[dict[str, np.ndarray], dict[str, int], int, int]:
 		"""Run inference for each configured stem."""	
 		if not self.loaded or not self.models:
 			logger.error(action="inference", status="failed", data={"worker_id": self.worker_id, "filename": file.filename, "error": "model_not_loaded"})
 			raise HTTPException(status_code=503, detail="Model not loaded")
-		audio = await file.read() # Read uploaded audio file
-		audio_buffer = io.BytesIO(audio) # Create in-memory buffer for audio data
-		waveform, sample_rate = sf.read(audio_buffer, dtype="float32")  # Decode audio using soundfile
+		waveform, sample_rate = await asyncio.to_thread(decode_audio, file.file) # Decode straight from the spooled upload, off the event loop; plain WAV (what main sends) is decoded with numpy, other formats go through soundfile
 		mix = self._prepare_input(waveform)
 
-		def _run_separation(mix: np.ndarray, sample_rate: int): # Additional function to run separation for time measurement
-			outputs: dict[str, np.ndarray] = {} # Store separated waveforms
-			sample_rates: dict[str, int] = {} # Store sample rates for each stem
-			t0_model = time.time() 
-			
-			for source, model in self.models.items(): # Run inference for each source
-				if self.double_chunk:
-					inf_ck = model.inference_chunk_size
-				else:
-					inf_ck = model.chunk_size
-				if self.overlap_add is None:
-					target_wav_hat = no_overlap_inference(model, mix, self.device, self.batch_size, inf_ck)
-				else:
-					if not os.path.exists(self.overlap_add.tmp_root):
-						os.makedirs(self.overlap_add.tmp_root)
-					target_wav_hat = overlap_inference(model, mix, self.device, self.batch_size, inf_ck, self.overlap_add.overlap_rate, self.overlap_add.tmp_root, self.overlap_add.samplerate)
-
-				outputs[source] = target_wav_hat 
-				sample_rates[source] = sample_rate 
-
-			t1_model = time.time()
-			return outputs, sample_rates, t0_model, t1_model
-
 		async with self.inference_lock:
-			return await asyncio.to_thread(_run_separation, mix, sample_rate)
+			return await asyncio.to_thread(self._run_separation, mix, sample_rate)
+
+	# === Separation Function ===
+	def _run_separation(self, mix: np.ndarray, sample_rate: int) -> tuple[dict[str, np.ndarray], dict[str, int], int, int]:
+		"""Run every source model over one mix and time the separation."""
+		t0_model = time.perf_counter_ns() # Monotonic; only the difference is meaningful
+		if self._source_pool is not None: # One thread and CUDA stream per source, so the four independent models can overlap on the GPU
+			target_wav_hats = list(self._source_pool.map(self._separate_source, self.models, [mix] * len(self.models)))
+			torch.cuda.synchronize(self.device) # Wait for all streams before the end time is taken
+		else:
+			target_wav_hats = [self._separate_source(source, mix) for source in self.models] # Run inference for each source
+
+		outputs: dict[str, np.ndarray] = dict(zip(self.models, target_wav_hats)) # Store separated waveforms
+		sample_rates: dict[str, int] = dict.fromkeys(self.models, sample_rate) # Store sample rates for each stem
+		t1_model = time.perf_counter_ns()
+		return outputs, sample_rates, t0_model, t1_model
+
+	# === Single Source Separation Function ===
+	def _separate_source(self, source: str, mix: np.ndarray) -> np.ndarray:
+		"""Run one source model over the mix on that source's CUDA stream, if any."""
+		model = self.models[source]
+		inf_ck = self._inf_ck[source]
+		autocast = torch.autocast(device_type="cuda", dtype=self.autocast_dtype) if self.autocast_dtype is not None else contextlib.nullcontext() # Layer-level dtype selection; the input mix stays float32
+		stream = torch.cuda.stream(self._streams[source]) if self._streams else contextlib.nullcontext()
+
+		with torch.inference_mode(), autocast, stream: # inference_mode and autocast are thread-local, so they are entered here in the thread running this source
+			if self.overlap_add is None:
+				target_wav_hat = no_overlap_inference(model, mix, self.device, self.batch_size, inf_ck)
+			else:
+				target_wav_hat = overlap_inference(model, mix, self.device, self.batch_size, inf_ck, self.overlap_add["overlap_rate"], self.overlap_add["tmp_root"], self.overlap_add["samplerate"]) # Plain dict from yaml.safe_load
+		return target_wav_hat if self.autocast_dtype is None else np.asarray(target_wav_hat, dtype=np.float32) # Stems leave the worker as float32 whatever precision produced them
+
+	# === Shutdown Function ===
+	async def close(self) -> None:
+		"""Stop the source threads on shutdown."""
+		if self._source_pool is not None:
+			self._source_pool.shutdown()
+			self._source_pool = None
 
 	# === Prepare Input Function ===
 	def _prepare_input(self, waveform: np.ndarray) -> np.ndarray:
 		"""Ensure the mixture tensor is shaped (channels, samples)."""
+		if waveform.dtype != np.float32: # Decoders normally return float32; convert anything else instead of passing float64 to the models
+			waveform = waveform.astype(np.float32)
 		if waveform.ndim == 1: # Mono
-			mix = np.stack([waveform, waveform], axis=0) # Duplicate to create fake stereo
+			mix = np.broadcast_to(waveform, (2, waveform.shape[0])) # Fake stereo as a read-only view; both rows share the samples instead of copying them
 		elif waveform.ndim == 2: # Multi-channel
-			mix = waveform.T if waveform.shape[1] <= waveform.shape[0] else waveform # Model expects (channels, samples)
+			frames_first = waveform.shape[0] >= waveform.shape[1] # soundfile returns (samples, channels); fewer rows than columns means already (channels, samples)
+			mix = waveform.T if frames_first else waveform # Model expects (channels, samples); transpose is a view
 			if mix.shape[0] == 1: # Single channel
-				mix = np.vstack([mix, mix]) # Duplicate to create fake stereo
+				mix = np.broadcast_to(mix, (2, mix.shape[1])) # Fake stereo view
 			elif mix.shape[0] > 2: # More than 2 channels
-				mix = mix[:2, :] # Use only first two channels
+				mix = mix[:2, :] # Use only first two channels (view)
 		else: 
 			raise HTTPException(status_code=400, detail="Unsupported audio shape")
 		
@@ -1,64 +1,140 @@
 from fastapi import UploadFile, HTTPException
 from scnet.inference import Seperator, SCNet
 from app.utils.logging_utils import get_logger
-from ml_collections import ConfigDict
+from workers.utils.worker_utils import decode_audio
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 import numpy as np
-import soundfile as sf
-import yaml, asyncio, importlib.util, io, time
+import torch, yaml, json, asyncio, importlib.util, os, time, contextlib, zipfile
 
 logger = get_logger(__name__) # Logger for SCNet Model
+_YAML_LOADER = getattr(yaml, "CFullLoader", yaml.FullLoader) # libyaml C loader when PyYAML was built with it, same FullLoader semantics otherwise
+
+_SCNET_SPEC = importlib.util.find_spec("scnet") # Resolved once at import; scnet is already imported above, so this only reads its module spec
+if _SCNET_SPEC is None:
+    raise ImportError("SCNet package not found")
+_SCNET_ROOT = Path(_SCNET_SPEC.submodule_search_locations[0]).resolve().parent # SCNet package root
+_WORKER_ROOT = Path(__file__).resolve().parent # SCNet worker directory
+_CONFIG_PATH = str(_SCNET_ROOT / "conf" / "config.yaml") # Path to SCNet default config
+_CHECKPOINT_PATH = str(_WORKER_ROOT / "checkpoints" / "checkpoint.th") # Path to SCNet checkpoint
+_CONFIG_CACHE_PATH = str(_WORKER_ROOT / "checkpoints" / "config.json") # JSON copy of the SCNet config, parsed much faster than YAML on later starts
+
+
+# === Memory-Mapped Checkpoint Loading Context ===
+@contextlib.contextmanager
+def _mmap_torch_load(checkpoint_path: str):
+    """Helper context manager to make torch.load memory-map the checkpoint while the external Seperator loads it, so pages are read on demand instead of copied into RAM up front"""
+    if not zipfile.is_zipfile(checkpoint_path): # Only the zip serialization format can be memory-mapped; legacy checkpoints load as before
+        yield
+        return
+
+    original_load = torch.load
+    def load(f, *args, **kwargs):
+        if isinstance(f, (str, os.PathLike)): # mmap needs a path, not an open file object
+            kwargs.setdefault("mmap", True)
+        return original_load(f, *args, **kwargs)
+
+    torch.load = load # Seperator takes only a checkpoint path and calls torch.load itself, so loading the state dict here would read the checkpoint twice; the global patch is safe because it is only active inside load_model during worker startup, before the lifespan yields, while no request handler or inference thread can call torch.load
+    try:
+        yield
+    finally:
+        torch.load = original_load
 
 
 # === SCNet Model Management Class ===
 class SCNetModel:
     """Class to manage SCNet model loading and inference."""
-    def __init__(self, worker_id: str):
+    def __init__(self, worker_id: str, precision: str | None = None, compile: bool = False):
         self.worker_id = worker_id
+        self.compile = compile
+        self.autocast_dtype: torch.dtype | None = None # Opt-in mixed precision; float32 unless precision is "bf16" or "fp16" and CUDA is available
+        if precision in ("bf16", "fp16") and torch.cuda.is_available(): # Seperator picks the GPU whenever one is available
+            self.autocast_dtype = torch.bfloat16 if precision == "bf16" and torch.cuda.is_bf16_supported() else torch.float16 # GPUs without bf16 support fall back to fp16
         self.separator: Seperator | None = None
         self.inference_lock = asyncio.Lock()
-        
-        spec = importlib.util.find_spec("scnet") # Check if SCNet package is importable
-        if spec is None:
-            raise ImportError("SCNet package not found")
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="scnet-infer") # Dedicated inference thread, so separations never wait on or tie up the default pool used by to_thread and FastAPI
 
-        self.scnet_root = Path(spec.submodule_search_locations[0]).resolve().parent # Get SCNet package root
-        self.config_path = str(self.scnet_root / "conf" / "config.yaml") # Path to SCNet default config
-        self.worker_root = Path(__file__).resolve().parents[0] # Get the project root
-        self.checkpoint_path = str(self.worker_root / "checkpoints" / "checkpoint.th") # Path to SCNet checkpoint
+        self.scnet_root = _SCNET_ROOT # Paths are resolved once at module import
+        self.config_path = _CONFIG_PATH
+        self.worker_root = _WORKER_ROOT
+        self.checkpoint_path = _CHECKPOINT_PATH
+        self.config_cache_path = _CONFIG_CACHE_PATH
 
     # === Model Loading Function ===
     async def load_model(self) -> None:
         """Function to load SCNet model, initialize separator instance on startup and try registering worker"""
-        with open(self.config_path, "r") as f: # Load SCNet config file
-            config = ConfigDict(yaml.load(f, Loader=yaml.FullLoader)) # Load YAML content
-            
-        model = SCNet(**config.model) # Unpack model configuration and create SCNet model instance
+        config = self._load_config()
+        model = SCNet(**config["model"]) # Unpack model configuration and create SCNet model instance
         model.eval() # Set model to evaluation mode
-        self.separator = Seperator(model, self.checkpoint_path) # Load model checkpoint into Seperator instance, select device automatically (CPU/GPU) and prepare for inference
+        if self.compile:
+            model.compile(dynamic=None) # In place, before Seperator takes the model, so it loads the checkpoint and moves the same module with unchanged state dict keys; the first length compiles static kernels, the first different length recompiles once with a dynamic length and later lengths reuse it
+        with _mmap_torch_load(self.checkpoint_path): # Patches torch.load process-wide, so keep it around the Seperator construction only; the mapping is dropped once Seperator has copied the weights into the model
+            self.separator = Seperator(model, self.checkpoint_path) # Load model checkpoint into Seperator instance, select device automatically (CPU/GPU) and prepare for inference
+        warmup = np.zeros((44100, 2), dtype=np.float32) # 1 s of stereo silence, (samples, channels) like decoded uploads
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(self._executor, self._run_separation, warmup, 44100) # First call pays CUDA context setup, kernel selection and the static-shape compilation here; the one dynamic-shape recompile happens on the first request of another length
+        except Exception as e:
+            if self.autocast_dtype is None:
+                raise
+            logger.warning(action="precision_check", status="fallback", data={"worker_id": self.worker_id, "precision": str(self.autocast_dtype), "fallback_precision": "float32", "error": str(e)}) # The external separator was not written for reduced precision (e.g. no bfloat16 in numpy, no half-precision iSTFT)
+            self.autocast_dtype = None
+            await loop.run_in_executor(self._executor, self._run_separation, warmup, 44100)
 
         logger.info(action="model_loading", status="success", data={"worker_id": self.worker_id})
 
+    # === Config Loading Function ===
+    def _load_config(self) -> dict:
+        """Function to load the SCNet config from its JSON copy, parsing the YAML and writing the copy when it is missing or older than the YAML"""
+        try:
+            if os.path.getmtime(self.config_cache_path) >= os.path.getmtime(self.config_path):
+                with open(self.config_cache_path, "rb") as f:
+                    return json.load(f)
+        except (OSError, ValueError): # No copy yet or unreadable; fall back to the YAML
+            pass
+
+        with open(self.config_path, "r") as f: # Load SCNet config file
+            config = yaml.load(f, Loader=_YAML_LOADER) # Load YAML content as plain dicts; the model section is only unpacked into keyword arguments
+        tmp_path = f"{self.config_cache_path}.{os.getpid()}.tmp" # Per-process name, so workers starting together never share a partial file
+        try:
+            with open(tmp_path, "w") as f:
+                json.dump(config, f)
+            os.replace(tmp_path, self.config_cache_path) # Atomic; readers see either the old copy or the complete new one
+        except (OSError, TypeError) as e: # Read-only checkpoint directory or values JSON cannot represent; the YAML is parsed again next start
+            logger.warning(action="config_caching", status="failed", data={"worker_id": self.worker_id, "error": str(e)})
+            with contextlib.suppress(OSError):
+                os.remove(tmp_path) # Do not leave a partial copy behind
+        return config
+
     # === Inference Function ===
-    async def perform_inference(self, file: UploadFile) -> tuple[dict[str, np.ndarray], dict[str, int], float, float]:
+    async def perform_inference(self, file: UploadFile) -> tuple[dict[str, np.ndarray], dict[str, int], int, int]:
         """Perform inference and return results."""
         if self.separator is None: # Check if separator is initialized
             logger.error(action="inference", status="failed", data={"worker_id": self.worker_id, "filename": file.filename, "error": "model_not_loaded"})
             raise HTTPException(status_code=503, detail="Model not loaded")
 
-        audio = await file.read() # Read uploaded audio file
-        audio_buffer = io.BytesIO(audio) # Create in-memory buffer for audio data
-        waveform, sample_rate = sf.read(audio_buffer, dtype="float32") # Read audio data from buffer
+        waveform, sample_rate = await asyncio.get_running_loop().run_in_executor(self._executor, decode_audio, file.file) # Decode straight from the spooled upload on the inference thread, off the event loop; plain WAV (what main sends) is decoded with numpy, other formats go through soundfile
         
-        def _run_separation(waveform_local, sample_rate_local): # Additional function to run separation for time measurement
-            t0_model = time.time()
-            outputs = self.separator.separate_music_file(waveform_local, sample_rate_local)
-            t1_model = time.time()
-            return (*outputs, t0_model, t1_model)
-
         async with self.inference_lock: # Acquire lock to serialize inference requests
-            return await asyncio.to_thread(_run_separation, waveform, sample_rate) # Perform inference in a separate thread and return timestamps
-    
+            return await asyncio.get_running_loop().run_in_executor(self._executor, self._run_separation, waveform, sample_rate) # Perform inference on the dedicated thread and return timestamps
+
+    # === Separation Function ===
+    def _run_separation(self, waveform: np.ndarray, sample_rate: int) -> tuple[dict[str, np.ndarray], dict[str, int], int, int]:
+        """Run the separator over one waveform and time the separation."""
+        t0_model = time.perf_counter_ns() # Monotonic; only the difference is meaningful
+        autocast = torch.autocast(device_type="cuda", dtype=self.autocast_dtype) if self.autocast_dtype is not None else contextlib.nullcontext() # Layer-level dtype selection; weights stay float32
+        with torch.inference_mode(), autocast: # No autograd bookkeeping; thread-local, so entered here in the inference thread
+            output_waveforms, output_sample_rates = self.separator.separate_music_file(waveform, sample_rate)
+        if self.autocast_dtype is not None:
+            output_waveforms = {name: np.asarray(stem, dtype=np.float32) for name, stem in output_waveforms.items()} # Stems leave the worker as float32 whatever precision produced them
+        t1_model = time.perf_counter_ns()
+        return output_waveforms, output_sample_rates, t0_model, t1_model
+
+    # === Shutdown Function ===
+    async def close(self) -> None:
+        """Stop the inference thread on shutdown."""
+        self._executor.shutdown()
+
     # === Check if Model is Loaded ===
     def is_loaded(self) -> bool:
         """Check if the SCNet model is loaded and ready for inference."""
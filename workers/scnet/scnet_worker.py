@@ -1,8 +1,8 @@
 from fastapi import FastAPI, UploadFile, HTTPException
 from fastapi.responses import StreamingResponse, JSONResponse
 from workers.scnet.scnet_model import SCNetModel
-from workers.api.worker_register_routes import worker_register_router, try_register
-from contextlib import asynccontextmanager
+from workers.api.worker_register_routes import worker_register_router, try_register, open_register_client, close_register_client
+from contextlib import asynccontextmanager, suppress
 from app.utils.config_utils import load_worker_config
 from workers.utils.worker_utils import validate_outputs, zipstream_generator
 from app.utils.logging_utils import setup_logging, get_logger
@@ -13,10 +13,16 @@ import asyncio
 async def lifespan(app: FastAPI):
     """On startup load SCNet model and try registering worker"""
     global scnet_model
-    scnet_model = SCNetModel(worker_id)
+    scnet_model = SCNetModel(worker_id, worker_config.precision, worker_config.compile)
     await scnet_model.load_model() # Load SCNet model on startup
-    asyncio.create_task(try_register(worker_id, model_type, worker_address, main_address)) # Attempt to register worker after model is loaded; asyncio task to not block startup otherwise registartion will not work  
+    open_register_client() # Create the registration client inside the running event loop
+    register_task = asyncio.create_task(try_register(worker_id, model_type, worker_address, main_address)) # Attempt to register worker after model is loaded; asyncio task to not block startup otherwise registartion will not work  
     yield # Pauses here; Code after yield runs on shutdown
+    register_task.cancel() # Stop retrying if registration is still in progress, so it never uses the client after it is closed
+    with suppress(asyncio.CancelledError):
+        await register_task
+    await scnet_model.close() # Stop the inference thread
+    await close_register_client() # Close pooled connections to main app
 
 
 app = FastAPI(title = "SCNetWorker", lifespan=lifespan)
@@ -47,17 +53,11 @@ async def inference(file: UploadFile) -> StreamingResponse:
         output_waveforms, output_sample_rates, t0_model, t1_model = await scnet_model.perform_inference(file)  # Ensure model is loaded
         validate_outputs(output_waveforms, output_sample_rates, worker_id=worker_id, filename=file.filename) # Validate inference outputs
         zipstream, headers = zipstream_generator(output_waveforms, output_sample_rates, worker_id, file.filename) # Create streaming ZIP response
-        logger.info(action="inference_processing", status="success", data={"worker_id": worker_id, "filename": file.filename, "num_stems": len(output_waveforms)})
 
         headers = dict(headers) if headers is not None else {} # If headers are provided (by zipstream_generator) make a shallow copy, else create empty dict
-        headers.setdefault("separation-start", str(t0_model)) # Attach separation timestamps to response headers so caller can measure separation-only time; Add separation start timestamp if not already present
-        headers.setdefault("separation-end", str(t1_model)) # Add separation end timestamp if not already present
+        headers.setdefault("separation-duration-ns", str(t1_model - t0_model)) # Attach separation duration to response headers so caller can measure separation-only time
+        logger.info(action="inference", status="success", data={"worker_id": worker_id, "filename": file.filename, "num_stems": len(output_waveforms), "separation-duration-ns": headers["separation-duration-ns"]}) # Single record per request
 
-        if headers.get("separation-start") and headers.get("separation-end"):
-            logger.info(action="inference_timestamp_receiving", status="success", data={"worker_id": worker_id, "filename": file.filename, "separation-start": headers["separation-start"], "separation-end": headers["separation-end"]})
-        if not headers.get("separation-start") or not headers.get("separation-end"):
-            logger.warning(action="inference_timestamp_receiving", status="failed", data={"worker_id": worker_id, "filename": file.filename, "error": "missing_separation_timestamps"})
-        
         return StreamingResponse(zipstream, media_type="application/zip", headers=headers) #Stream the ZIP file as a response
 
     except HTTPException:
@@ -1,23 +1,24 @@
 from fastapi import HTTPException
 from app.utils.logging_utils import get_logger
+from app.utils.wav_utils import wav_header, to_pcm16
 from zipstream.ng import ZipStream
 import numpy as np
 import soundfile as sf
-from typing import Generator
-import io
+from typing import BinaryIO, Generator
+import io, struct
 
 logger = get_logger(__name__) # Logger for main module
 
 
-# === Helper Buffer Generator Function ===
-def _buffer_generator(waveform: np.ndarray, sample_rate: int, chunk_size: int = 256 * 1024) -> Generator[bytes, None, None]:
-    """Helper function to yield WAV-encoded chunks without loading entire response in memory"""
+# === Helper Waveform Layout Function ===
+def _as_frames(waveform: np.ndarray) -> np.ndarray:
+    """Helper function to validate a stem waveform and return it as a (samples, channels) view"""
     if not isinstance(waveform, np.ndarray): # Check that waveform is a numpy array
         raise ValueError(f"Waveform is not a numpy array; type={type(waveform)}")
     if waveform.dtype != np.float32: # Check that waveform dtype is float32
         raise ValueError(f"Waveform dtype is not float32; dtype={waveform.dtype}")
     if waveform.ndim == 1: # Mono
-        pass
+        waveform = waveform[:, np.newaxis]
     elif waveform.ndim == 2: # Multi-channel
         if waveform.shape[1] in [1, 2]: # Check if channels are in second dimension
             pass  # Already correct
@@ -27,15 +28,69 @@ def _buffer_generator(waveform: np.ndarray, sample_rate: int, chunk_size: int =
             raise ValueError(f"Waveform has invalid channel count; shape={waveform.shape}")
     else:
         raise ValueError(f"Waveform has invalid number of dimensions; shape={waveform.shape}")
-    
-    buffer = io.BytesIO()
-    sf.write(buffer, waveform, sample_rate, format="WAV")
-    buffer.seek(0)
-    while True:
-        chunk = buffer.read(chunk_size)
-        if not chunk:
-            break
-        yield chunk
+    return waveform
+
+
+# === Helper Buffer Generator Function ===
+def _buffer_generator(frames: np.ndarray, sample_rate: int, chunk_frames: int = 64 * 1024) -> Generator[bytes, None, None]:
+    """Helper function to yield a 16-bit PCM WAV block by block as the ZIP stream is sent, without encoding the whole stem first"""
+    num_frames, num_channels = frames.shape
+    yield wav_header(num_frames, num_channels, sample_rate)
+    for start in range(0, num_frames, chunk_frames):
+        yield to_pcm16(frames[start:start + chunk_frames]).tobytes()
+
+
+# === Helper Fast WAV Decode Function ===
+_WAV_DTYPES = {(1, 16): "<i2", (3, 32): "<f4"} # (format tag, bits per sample) -> sample dtype; PCM_16 is what main sends to the workers
+
+def _fast_wav_decode(file: BinaryIO, read_size: int = 1 << 20) -> tuple[np.ndarray, int] | None:
+    """Helper function to decode a 16-bit PCM or 32-bit float WAV file object with numpy; returns None for anything else so the caller can fall back to libsndfile"""
+    header = file.read(12)
+    if len(header) < 12 or header[:4] != b"RIFF" or header[8:12] != b"WAVE":
+        return None
+    fmt = None
+    while len(chunk_header := file.read(8)) == 8: # Walk the chunks; writers may put LIST/fact chunks before data
+        chunk_id, chunk_size = struct.unpack("<4sI", chunk_header)
+        if chunk_id == b"fmt ":
+            body = file.read(chunk_size + (chunk_size & 1))
+            if len(body) < 16:
+                return None
+            format_tag, num_channels, sample_rate, _, block_align, bits = struct.unpack_from("<HHIIHH", body)
+            fmt = (format_tag, num_channels, sample_rate, block_align, bits)
+        elif chunk_id == b"data":
+            if fmt is None or fmt[1] == 0 or (fmt[0], fmt[4]) not in _WAV_DTYPES:
+                return None
+            format_tag, num_channels, sample_rate, block_align, bits = fmt
+            position = file.tell()
+            remaining = file.seek(0, io.SEEK_END) - position # Clamp in case the size field was left unset by a streaming writer
+            file.seek(position)
+            num_frames = min(chunk_size, remaining) // block_align
+            samples = np.empty(num_frames * num_channels, dtype=_WAV_DTYPES[(format_tag, bits)])
+            view, filled = memoryview(samples).cast("B"), 0
+            while filled < len(view) and (block := file.read(min(read_size, len(view) - filled))): # Fill the sample array in bounded reads, never holding the whole file as bytes
+                view[filled:filled + len(block)] = block
+                filled += len(block)
+            interleaved = samples[:filled // block_align * num_channels].reshape(-1, num_channels) # (samples, channels) as stored in the file
+            planar = np.empty((num_channels, len(interleaved)), dtype=np.float32) # Channel-first, each channel contiguous
+            if samples.dtype == np.int16:
+                np.multiply(interleaved.T, np.float32(1 / 32768), out=planar) # De-interleave and scale in one pass; same scaling libsndfile applies when reading 16-bit PCM as float
+            else:
+                planar[...] = interleaved.T # De-interleave in one pass
+            return (planar[0] if num_channels == 1 else planar.T), sample_rate # (samples, channels) like sf.read, mono as 1-D; the transpose view means models that take waveform.T get contiguous channels without another gather
+        else:
+            file.seek(chunk_size + (chunk_size & 1), io.SEEK_CUR) # Chunks are word aligned
+    return None
+
+
+# === Decode Uploaded Audio Function ===
+def decode_audio(file: BinaryIO) -> tuple[np.ndarray, int]:
+    """Function to decode an uploaded audio file object to a float32 (samples, channels) waveform and sample rate, skipping libsndfile for plain WAV files; for those the waveform is a transposed channel-first array, so waveform.T is C-contiguous"""
+    file.seek(0)
+    decoded = _fast_wav_decode(file)
+    if decoded is None: # Other containers and encodings (FLAC, OGG, 24-bit PCM, ...)
+        file.seek(0)
+        decoded = sf.read(file, dtype="float32") # libsndfile reads the file object incrementally
+    return decoded
 
 
 # === Validate Inference Outputs Function ===
@@ -69,7 +124,9 @@ def zipstream_generator(waveforms: dict[str, np.ndarray], sample_rates: dict[str
     """Function to create a streaming ZIP plus headers for separated stems with consistent logging"""
     zipstream = ZipStream(sized=True)
     for name, waveform in waveforms.items():
-        zipstream.add(_buffer_generator(waveform, sample_rates[name]), f"{name}.wav")
+        frames = _as_frames(waveform) # Validated up front, so a bad stem fails the request before anything is sent
+        wav_size = 44 + frames.size * 2 # Header plus 16-bit samples; known size lets the sized ZipStream keep the generator lazy instead of joining it into memory
+        zipstream.add(_buffer_generator(frames, sample_rates[name]), f"{name}.wav", size=wav_size)
         logger.debug(action="stem_addition", status="success", data={"worker_id": worker_id, "stem": name})
 
     headers = {"Content-Disposition": f'attachment; filename="{filename}_separated_stems.zip"'}